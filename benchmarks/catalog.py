@@ -0,0 +1,49 @@
+# Benchmark the in-memory catalog: build time, memory footprint and searches vs the database
+
+import argparse
+import tracemalloc
+
+from vault.models.base import get_session
+from vault.modules.carry import global_scope
+from vault.views import secrets
+
+from .common import create_vault, timeit, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of secrets (default: 100000)")
+    args = parser.parse_args()
+
+    create_vault(args.count)
+
+    # Database
+    for query in ['secret 12345', 'example-999']:
+        report("database: search('%s')" % (query),
+               timeit(lambda: get_session().expunge_all() or secrets.search(query)))
+    report('database: list_all()',
+           timeit(lambda: get_session().expunge_all() or secrets.list_all()), args.count)
+
+    # Catalog
+    report('catalog: build', timeit(secrets.build_catalog), args.count)
+
+    tracemalloc.start()
+    catalog = secrets.build_catalog()
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    per_100k = 100000 / len(catalog) / 1024 / 1024
+    print('%-40s %10.1f MB (estimate: %.1f MB)' % ('catalog: memory per 100k secrets',
+                                                   traced * per_100k, catalog.get_size() * per_100k))
+
+    for query in ['secret 12345', 'example-999']:
+        report("catalog: search('%s')" % (query),
+               timeit(lambda: secrets.search(query)))
+    report('catalog: list_all()', timeit(secrets.list_all), args.count)
+
+    global_scope['catalog'] = None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Shared helpers for the benchmarks
+#
+# Benchmarks are run from the project root against an installed copy of Vault:
+#   python3 setup.py install
+#   python3 -m benchmarks.export_json
+
+import os
+import tempfile
+import time
+import uuid
+
+from vault.lib.Config import Config
+from vault.lib.Encryption import Encryption
+from vault.models.base import Base, get_engine, get_session
+from vault.models.Category import CategoryModel
+from vault.models.Secret import SecretModel
+from vault.modules.carry import global_scope
+from vault.views.users import validation_key_new, data_key_new
+
+
+def create_vault(count, notes='Some notes', categories=10):
+    """
+        Create a temporary vault populated with `count` secrets
+    """
+
+    dir_ = tempfile.mkdtemp()
+
+    global_scope['db_file'] = os.path.join(dir_, 'vault.db')
+    global_scope['conf'] = Config(os.path.join(dir_, 'config'))
+    global_scope['enc'] = Encryption(str(uuid.uuid4()).encode())
+
+    Base.metadata.create_all(get_engine())
+    validation_key_new()
+    data_key_new()
+
+    session = get_session()
+    for i in range(categories):
+        session.add(CategoryModel(name='Category %d' % (i)))
+
+    for i in range(count):
+        session.add(SecretModel(name='Secret %d' % (i),
+                                url='https://www.example-%d.com' % (i),
+                                login='user%d@example.com' % (i % 100),
+                                password=str(uuid.uuid4()),
+                                notes=notes,
+                                category_id=i % categories + 1))
+    session.commit()
+
+    return dir_
+
+
+def timeit(func, repeat=3):
+    """
+        Return the best wall time of `repeat` calls to `func`
+    """
+
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def report(label, seconds, count=None):
+    """
+        Print a benchmark result
+    """
+
+    if count:
+        print('%-40s %10.1f ms %12.0f /s' %
+              (label, seconds * 1000, count / seconds))
+    else:
+        print('%-40s %10.1f ms' % (label, seconds * 1000))
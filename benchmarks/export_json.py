@@ -0,0 +1,34 @@
+# Benchmark `import_export.export_to_json()`, with and without the derived key cache
+
+import argparse
+import os
+
+from vault.modules.carry import global_scope
+from vault.views import import_export
+
+from .common import create_vault, timeit, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Number of secrets (default: 10000)")
+    args = parser.parse_args()
+
+    dir_ = create_vault(args.count)
+    path = os.path.join(dir_, 'export.json')
+
+    # The vault is already unlocked
+    import_export.unlock = lambda: True
+
+    enc = global_scope['enc']
+    for cache_size in [0, enc.cache_size]:
+        enc.cache_size = cache_size
+        enc.clear_cache()
+
+        report('export_to_json (key cache: %d)' % (cache_size),
+               timeit(lambda: import_export.export_to_json(path)), args.count)
+
+
+if __name__ == '__main__':
+    main()
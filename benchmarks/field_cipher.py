@@ -0,0 +1,36 @@
+# Benchmark per-field decryption throughput for each encrypted field format
+
+import argparse
+import uuid
+
+from vault.lib.Encryption import Encryption
+
+from .common import timeit, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=20000,
+                        help="Number of fields (default: 20000)")
+    parser.add_argument("-s", "--size", type=int, default=64,
+                        help="Field size in bytes (default: 64)")
+    args = parser.parse_args()
+
+    key = str(uuid.uuid4()).encode()
+    field = b'x' * args.size
+
+    for version in range(1, Encryption.latest_version + 1):
+        enc = Encryption(key, cache_size=args.count, version=version)
+        salts = [enc.gen_salt(set_=False) for i in range(args.count)]
+        fields = enc.encrypt_many((salt, field) for salt in salts)
+        items = list(zip(salts, fields))
+
+        # Derived keys are cached during the first run, so we only measure the cipher
+        report('decrypt_with_salt (version %d, %d bytes)' % (version, args.size),
+               timeit(lambda: [enc.decrypt_with_salt(*item) for item in items]), args.count)
+        report('decrypt_many (version %d, %d bytes)' % (version, args.size),
+               timeit(lambda: enc.decrypt_many(items)), args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Benchmark the fuzzy search: n-gram candidate filtering vs scoring every secret
+
+import argparse
+import random
+import string
+import tracemalloc
+
+from vault.lib.Catalog import Catalog
+
+from .common import timeit, report
+
+
+def get_word(random_):
+    """
+        Return a random pronounceable word
+    """
+
+    return ''.join(random_.choice('bcdfgklmnprstvz') + random_.choice('aeiou')
+                   for i in range(random_.randint(2, 4)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of secrets (default: 100000)")
+    args = parser.parse_args()
+
+    random_ = random.Random(0)
+    rows = []
+    for i in range(1, args.count + 1):
+        name = ' '.join(get_word(random_) for j in range(random_.randint(1, 2)))
+        rows.append((i, name.title(), 'https://www.%s.com' % (get_word(random_)),
+                     '%s@%s.com' % (get_word(random_), random.choice(['gmail', 'example'])), None))
+
+    catalog = Catalog(rows)
+
+    report('n-gram index: build', timeit(lambda: setattr(catalog, 'fuzzy', None) or catalog.get_fuzzy(), 1),
+           args.count)
+
+    catalog.fuzzy = None
+    tracemalloc.start()
+    catalog.get_fuzzy()
+    print('%-40s %10.1f MB' % ('n-gram index: memory',
+                               tracemalloc.get_traced_memory()[0] / 1024 / 1024))
+    tracemalloc.stop()
+
+    fuzzy = catalog.get_fuzzy()
+    queries = []
+    for name in [rows[args.count // 2][1], rows[args.count // 3][1]]:
+        word = name.split(' ')[0].lower()
+        position = random_.randrange(len(word))
+        queries.append(word[:position] + random_.choice(string.ascii_lowercase) + word[position + 1:])
+    queries.append(queries[0][:3])
+
+    for query in queries:
+        tokens = fuzzy.get_tokens(query)
+        report("candidates('%s'): %d" % (query, len(fuzzy.get_candidates(tokens))),
+               timeit(lambda: fuzzy.get_candidates(tokens)))
+        report("search_fuzzy('%s')" % (query), timeit(lambda: catalog.search_fuzzy(query)))
+
+        # Without candidate filtering, every secret is scored
+        report("score all('%s')" % (query),
+               timeit(lambda: [fuzzy.get_score(tokens, catalog.get_fields(position))
+                               for position in range(len(catalog))], 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Benchmark the queries served by the secrets indexes, with and without the indexes
+
+import argparse
+
+from vault.models.base import get_session
+from vault.models.Secret import SecretModel
+from vault.models.Category import CategoryModel
+from vault.views import secrets, categories, upgrade
+
+from .common import create_vault, timeit, report
+
+
+def drop_indexes():
+    """
+        Drop the indexes, as in vaults created before they were added
+    """
+
+    for model in [SecretModel, CategoryModel]:
+        for index in model.__table__.indexes:
+            get_session().execute('DROP INDEX %s' % (index.name))
+    get_session().commit()
+
+
+def measure(label):
+    """
+        Report the timings of the indexed queries
+    """
+
+    report('%s: categories.is_used() (unused)' % (label),
+           timeit(lambda: categories.is_used(999)))
+    report('%s: secrets.get_top_logins()' % (label),
+           timeit(secrets.get_top_logins))
+    report("%s: name LIKE 'secret 99%%'" % (label),
+           timeit(lambda: get_session().query(SecretModel.id).filter(SecretModel.name.like('secret 99%')).all()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of secrets (default: 100000)")
+    args = parser.parse_args()
+
+    create_vault(args.count)
+
+    drop_indexes()
+    measure('no indexes')
+
+    upgrade.create_indexes()
+    get_session().commit()
+    measure('indexes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Benchmark listing all secrets: model instances (ORM) vs `CatalogRow` records (Core),
+# and the first page of the paged listing
+
+import argparse
+import tracemalloc
+
+from vault.models.base import get_session
+from vault.views import secrets
+from vault.views.categories import get_names as get_category_names
+
+from .common import create_vault, timeit, report
+
+
+def measure_memory(label, func):
+    """
+        Report the memory held by the result of `func`
+    """
+
+    get_session().expunge_all()
+    tracemalloc.start()
+    rows = func()
+    print('%-40s %10.1f MB' % ('%s: memory' % (label),
+                               tracemalloc.get_traced_memory()[0] / 1024 / 1024))
+    tracemalloc.stop()
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of secrets (default: 100000)")
+    args = parser.parse_args()
+
+    create_vault(args.count)
+
+    # Start each listing with a cold session
+    report('ORM: secrets.all()',
+           timeit(lambda: get_session().expunge_all() or secrets.all()), args.count)
+    report('Core: secrets.select_rows()',
+           timeit(lambda: get_session().expunge_all() or secrets.select_rows()), args.count)
+
+    report('ORM: to_table(all())',
+           timeit(lambda: get_session().expunge_all() or secrets.to_table(secrets.all()), 1), args.count)
+    report('Core: to_table(select_rows())',
+           timeit(lambda: get_session().expunge_all() or secrets.to_table(secrets.select_rows()), 1),
+           args.count)
+
+    # The paged listing only reads and renders the first page before it is displayed
+    names = get_category_names()
+    report('Paged: first page (50 rows)',
+           timeit(lambda: get_session().expunge_all() or secrets.to_page(next(secrets.iter_pages()), names)))
+
+    measure_memory('ORM: secrets.all()', secrets.all)
+    measure_memory('Core: secrets.select_rows()', secrets.select_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Benchmark the time needed to open the vault with a passphrase vs a raw SQLCipher key
+
+import argparse
+
+from vault.lib.KeyDerivation import KeyDerivation
+from vault.models.base import get_session, drop_sessions
+from vault.models.User import UserModel
+from vault.modules.carry import global_scope
+from vault.views import change_key, secrets
+
+from .common import create_vault, timeit, report
+
+
+def open_vault():
+    """
+        Create a new engine and read the first page, as done when unlocking the vault
+    """
+
+    drop_sessions()
+    get_session().query(UserModel).count()
+
+
+def measure(label, count):
+    """
+        Report the open latency and a full listing
+    """
+
+    report('%s: open' % (label), timeit(open_vault))
+    report('%s: secrets.all()' % (label),
+           timeit(lambda: get_session().expunge_all() or secrets.all()), count)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Number of secrets (default: 10000)")
+    args = parser.parse_args()
+
+    create_vault(args.count)
+
+    measure('passphrase (default kdf_iter)', args.count)
+
+    change_key.export_db(raw_key=False, kdf_iter=64000)
+    measure('passphrase (kdf_iter=64000)', args.count)
+
+    # Raw keys require a calibrated master key derivation, it is part of the open latency
+    iterations = KeyDerivation().calibrate()
+    change_key.export_db(raw_key=True, iterations=iterations)
+    measure('raw key (%d iterations)' % (iterations), args.count)
+
+    change_key.export_db(raw_key=True, page_size=16384)
+    global_scope['conf'].update('cacheSize', -8000, quiet=True)
+    measure('raw key (16 kB pages, 8 MB cache)', args.count)
+
+
+if __name__ == '__main__':
+    main()
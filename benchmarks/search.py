@@ -0,0 +1,43 @@
+# Benchmark keyword searches: LIKE '%q%' table scan vs the full-text search index
+
+import argparse
+
+from sqlalchemy import or_
+
+from vault.models.base import get_session
+from vault.models.Secret import SecretModel
+from vault.views import secrets
+
+from .common import create_vault, timeit, report
+
+
+def search_like(query):
+    """
+        Keyword search with a table scan, as done before the full-text search index
+    """
+
+    like = '%' + query + '%'
+
+    return get_session().query(SecretModel) \
+        .filter(or_(SecretModel.name.like(like), SecretModel.url.like(like), SecretModel.login.like(like))) \
+        .order_by(SecretModel.id).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=200000,
+                        help="Number of secrets (default: 200000)")
+    args = parser.parse_args()
+
+    create_vault(args.count)
+
+    for query in ['secret 12345', 'example-999', 'user42@']:
+        count = len(secrets.search(query))
+        report("LIKE '%%%s%%' (%d results)" % (query, count),
+               timeit(lambda: get_session().expunge_all() or search_like(query)))
+        report("FTS '%s' (%d results)" % (query, count),
+               timeit(lambda: get_session().expunge_all() or secrets.search(query)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Benchmark the database size, listing and export timings of base 64 vs raw encrypted fields
+
+import argparse
+import base64
+import os
+
+from vault.models.base import get_session
+from vault.models.SecretPayload import SecretPayloadModel
+from vault.modules.carry import global_scope
+from vault.views import import_export, secrets, upgrade
+
+from .common import create_vault, timeit, report
+
+
+def to_base64():
+    """
+        Convert raw fields back to the legacy base 64 storage
+    """
+
+    enc = global_scope['enc']
+
+    def encode(value):
+        version, data = enc.unpack(value)
+        prefix = enc.gcm_prefix if version == 2 else b''
+        return prefix + base64.b64encode(bytes(data))
+
+    rows = get_session().query(
+        SecretPayloadModel.id, SecretPayloadModel._password, SecretPayloadModel._notes).all()
+    get_session().bulk_update_mappings(SecretPayloadModel, [
+        {'id': id_, '_password': encode(password), '_notes': encode(notes)}
+        for id_, password, notes in rows])
+    get_session().commit()
+    upgrade.vacuum()
+
+
+def measure(label, count, path):
+    """
+        Report the database size, listing and export timings
+    """
+
+    # Start with a cold session
+    get_session().expunge_all()
+
+    print('%-40s %10.1f kB' % ('%s: database size' % (label),
+                               os.path.getsize(global_scope['db_file']) / 1024))
+    report('%s: secrets.all()' % (label),
+           timeit(lambda: get_session().expunge_all() or secrets.all()), count)
+    report('%s: export_to_json' % (label),
+           timeit(lambda: import_export.export_to_json(path)), count)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Number of secrets (default: 10000)")
+    parser.add_argument("-s", "--notes_size", type=int, default=200,
+                        help="Notes size in bytes (default: 200)")
+    args = parser.parse_args()
+
+    dir_ = create_vault(args.count, notes='x' * args.notes_size)
+    path = os.path.join(dir_, 'export.json')
+
+    # The vault is already unlocked
+    import_export.unlock = lambda: True
+
+    to_base64()
+    measure('base 64', args.count, path)
+
+    upgrade.convert_raw_fields()
+    get_session().commit()
+    upgrade.vacuum()
+    measure('raw', args.count, path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import sys
+
+from .FuzzySearch import FuzzySearch
+
+
+class CatalogRow():
+    """
+        A secret as listed by the catalog or read without the ORM (without its encrypted fields)
+    """
+
+    __slots__ = ('id', 'name', 'url', 'login', 'category_id')
+
+    def __init__(self, id, name, url, login, category_id):
+        self.id = id
+        self.name = name
+        self.url = url
+        self.login = login
+        self.category_id = category_id
+
+    def __repr__(self):
+        return "<CatalogRow(id='%s', name='%s', login='%s')>" % (
+            self.id, self.name, self.login)
+
+
+class Catalog():
+    """
+        In-memory catalog of the secrets names, URLs, logins and categories.
+        Each field is stored in its own column (arrays for integers, lists for strings),
+        rows are sorted by ID.
+        Searches run on a single lowercased string of all rows, built on the first search
+        following a change.
+        Fuzzy searches use an n-gram index built on the first fuzzy search, then kept up to date.
+        The number of secrets of each category is kept up to date as well.
+    """
+
+    def __init__(self, rows=[]):
+        self.ids = array('q')
+        self.category_ids = array('q')  # `0` for secrets without a category
+        self.names = []
+        self.urls = []
+        self.logins = []
+        self.text = None  # Lowercased names, URLs and logins of all rows
+        self.offsets = None  # Position of each row in `text`
+        self.fuzzy = None  # N-gram index of the names, URLs and logins
+        self.category_counts = Counter()  # Category ID (`0` for none) => number of secrets
+
+        for row in rows:
+            self.add(*row)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_position(self, id_):
+        """
+            Return the position of a secret in the columns, or `None` if it is not in the catalog
+        """
+
+        position = bisect_left(self.ids, id_)
+
+        if position < len(self.ids) and self.ids[position] == id_:
+            return position
+
+        return None
+
+    def get_key(self, name, url, login):
+        """
+            Return the string searched for a secret
+        """
+
+        return '\n'.join([name or '', url or '', login or '']).lower()
+
+    def add(self, id_, name, url, login, category_id=None):
+        """
+            Add a secret to the catalog
+        """
+
+        # New IDs are the highest ones, the secret is usually appended
+        position = bisect_left(self.ids, id_)
+
+        self.ids.insert(position, id_)
+        self.category_ids.insert(position, category_id or 0)
+        self.names.insert(position, name)
+        self.urls.insert(position, url)
+        self.logins.insert(position, login)
+        self.text = None
+        self.count_category(category_id or 0, 1)
+
+        if self.fuzzy is not None:
+            self.fuzzy.add(id_, (name, url, login))
+
+        return True
+
+    def update(self, id_, name, url, login, category_id=None):
+        """
+            Update a secret in the catalog
+        """
+
+        position = self.get_position(id_)
+        if position is None:
+            return self.add(id_, name, url, login, category_id)
+
+        if self.fuzzy is not None:
+            self.fuzzy.delete(id_, self.get_fields(position))
+            self.fuzzy.add(id_, (name, url, login))
+
+        self.count_category(self.category_ids[position], -1)
+        self.count_category(category_id or 0, 1)
+        self.category_ids[position] = category_id or 0
+        self.names[position] = name
+        self.urls[position] = url
+        self.logins[position] = login
+        self.text = None
+
+        return True
+
+    def delete(self, id_):
+        """
+            Remove a secret from the catalog
+        """
+
+        position = self.get_position(id_)
+        if position is None:
+            return False
+
+        if self.fuzzy is not None:
+            self.fuzzy.delete(id_, self.get_fields(position))
+
+        self.count_category(self.category_ids[position], -1)
+
+        for column in [self.ids, self.category_ids, self.names, self.urls, self.logins]:
+            del column[position]
+        self.text = None
+
+        return True
+
+    def count_category(self, category_id, change):
+        """
+            Change the number of secrets of a category
+        """
+
+        self.category_counts[category_id] += change
+        if self.category_counts[category_id] <= 0:
+            del self.category_counts[category_id]
+
+    def get_category_count(self, category_id):
+        """
+            Return the number of secrets of a category (`None` for secrets without a category)
+        """
+
+        return self.category_counts.get(category_id or 0, 0)
+
+    def get_row(self, position):
+        """
+            Return the secret at a given position
+        """
+
+        return CatalogRow(self.ids[position], self.names[position], self.urls[position],
+                          self.logins[position], self.category_ids[position] or None)
+
+    def get_fields(self, position):
+        """
+            Return the name, URL and login of the secret at a given position
+        """
+
+        return (self.names[position], self.urls[position], self.logins[position])
+
+    def get(self, id_):
+        """
+            Return a secret by ID, or `None`
+        """
+
+        position = self.get_position(id_)
+        if position is None:
+            return None
+
+        return self.get_row(position)
+
+    def all(self):
+        """
+            Return all secrets, sorted by ID
+        """
+
+        return self.get_rows(0, len(self.ids))
+
+    def get_rows(self, start, stop):
+        """
+            Return the secrets from position `start` to `stop` (excluded)
+        """
+
+        return [self.get_row(position) for position in range(start, min(stop, len(self.ids)))]
+
+    def get_text(self):
+        """
+            Return the string searched for all rows, rows are separated by `\0`
+        """
+
+        if self.text is None:
+            keys = [self.get_key(name, url, login)
+                    for name, url, login in zip(self.names, self.urls, self.logins)]
+
+            self.offsets = array('q')
+            offset = 0
+            for key in keys:
+                self.offsets.append(offset)
+                offset += len(key) + 1
+
+            self.text = '\0'.join(keys)
+
+        return self.text
+
+    def search(self, query):
+        """
+            Return the secrets with a name, URL or login containing `query` (case-insensitive)
+        """
+
+        if not self.ids:
+            return []
+
+        query = str(query).lower()
+        text = self.get_text()
+
+        positions = []
+        found = text.find(query)
+        while found != -1:
+            position = bisect_right(self.offsets, found) - 1
+            positions.append(position)
+
+            # Continue with the next row
+            if position + 1 >= len(self.offsets):
+                break
+            found = text.find(query, self.offsets[position + 1])
+
+        return [self.get_row(position) for position in positions]
+
+    def get_fuzzy(self):
+        """
+            Return the n-gram index, built on the first call
+        """
+
+        if self.fuzzy is None:
+            self.fuzzy = FuzzySearch()
+            for position, id_ in enumerate(self.ids):
+                self.fuzzy.add(id_, self.get_fields(position))
+
+        return self.fuzzy
+
+    def search_fuzzy(self, query, limit=10):
+        """
+            Return up to `limit` secrets approximately matching `query`, best matches first
+        """
+
+        ids = self.get_fuzzy().search(
+            str(query), lambda id_: self.get_fields(self.get_position(id_)), limit)
+
+        return [self.get(id_) for id_ in ids]
+
+    def get_names(self, limit=2000):
+        """
+            Return up to `limit` non-empty names, sorted by ID
+        """
+
+        names = []
+        for name in self.names:
+            if len(names) >= limit:
+                break
+            if name:
+                names.append(name)
+
+        return names
+
+    def get_size(self):
+        """
+            Return an estimate of the memory used by the catalog, in bytes
+        """
+
+        size = sum(sys.getsizeof(column)
+                   for column in [self.ids, self.category_ids, self.names, self.urls, self.logins,
+                                  self.get_text(), self.offsets])
+
+        # Strings (shared strings are counted once)
+        strings = {id(value): value
+                   for column in [self.names, self.urls, self.logins]
+                   for value in column if value is not None}
+
+        return size + sum(sys.getsizeof(value) for value in strings.values())
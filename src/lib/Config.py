@@ -8,15 +8,30 @@ class Config:
     # Config file location
     config_path = None
 
-    # Config
-    config = configparser.ConfigParser()
+    # Types of the config values, other values are returned as strings
+    types = {
+        'keyVersion': int,
+        'clipboardTTL': int,
+        'hideSecretTTL': int,
+        'autoLockTTL': int,
+        'encryptedDb': bool,
+        'kdfIterations': int,
+        'rawKey': bool,
+        'cipherKdfIter': int,
+        'cipherPageSize': int,
+        'cacheSize': int,
+    }
 
     def __init__(self, config_path):
         self.config_path = config_path
+        self.config = configparser.ConfigParser()
+        self.file_stat = None  # Modification time, inode and size of the config file when it was last read
+        self.values = {}  # Parsed values
 
     def get_config(self):
         """
             Will return a user config and set a default if necessary
+            The file is only read again when it has been modified
         """
 
         # Generate a default config the first time
@@ -24,9 +39,36 @@ class Config:
             self.set_default_config_file()
 
         # Load existing config
-        self.config.read(self.config_path)
+        file_stat = self.get_file_stat()
+        if file_stat != self.file_stat:
+            self.config = configparser.ConfigParser()
+            self.config.read(self.config_path)
+            self.file_stat = file_stat
+            self.values = {}
+
         return self.config['MAIN']
 
+    def get(self, name):
+        """
+            Return a config value parsed according to `types`, or `None` if it is not set
+        """
+
+        config = self.get_config()
+
+        if name not in self.values:
+            if name not in config:  # For values that don't exist in the config file
+                return None
+
+            type_ = self.types.get(name)
+            if type_ is int:
+                self.values[name] = config.getint(name)
+            elif type_ is bool:
+                self.values[name] = config.getboolean(name)
+            else:
+                self.values[name] = config[name]
+
+        return self.values[name]
+
     def set_default_config_file(self):
         """
             Set a user default config file
@@ -34,7 +76,7 @@ class Config:
 
         self.config['MAIN'] = {
             'version': '2.00',
-            'keyVersion': '1',  # Will be used to support legacy key versions if the algorithm changes
+            'keyVersion': '2',  # Encrypted fields format, see `Encryption.latest_version`
             'salt': self.generate_random_salt(),
             'clipboardTTL': '15',
             'hideSecretTTL': '5',
@@ -45,32 +87,74 @@ class Config:
         # Save
         self.save_config()
 
-    def update(self, name, value):
+    def update(self, name, value, quiet=False):
         """
             Update a config value
         """
 
         # Set new value
-        self.config['MAIN'][name] = str(value)
+        self.get_config()[name] = str(value)
 
-        print()
-        print('The setting `%s` is now set to `%s`.' % (name, value))
-        print()
+        if not quiet:
+            print()
+            print('The setting `%s` is now set to `%s`.' % (name, value))
+            print()
 
         # Save
         return self.save_config()
 
+    def update_many(self, values):
+        """
+            Update several config values, saved at once.
+            If they cannot be saved, the values of the file are kept.
+        """
+
+        config = self.get_config()
+        previous = {name: config.get(name) for name in values}
+
+        try:
+            for name, value in values.items():
+                config[name] = str(value)
+
+            return self.save_config()
+        except Exception:
+            for name, value in previous.items():
+                if value is None:
+                    config.pop(name, None)
+                else:
+                    config[name] = value
+            self.values = {}
+
+            raise
+
     def save_config(self):
         """
             Save user config to a file
         """
 
-        with open(self.config_path, 'w') as configfile:
+        # Write a new file and swap it, so that other instances notice the change
+        # even when it happens within the file system timestamp granularity
+        tmp_path = self.config_path + '.tmp'
+        with open(tmp_path, 'w') as configfile:
             self.config.write(configfile)
-        os.chmod(self.config_path, 0o600)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.config_path)
+
+        # No need to read the file again
+        self.file_stat = self.get_file_stat()
+        self.values = {}
 
         return True
 
+    def get_file_stat(self):
+        """
+            Return what identifies a version of the config file
+        """
+
+        stat = os.stat(self.config_path)
+
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
     def generate_random_salt(self):
         """
             Generate a random salt
@@ -86,7 +170,4 @@ class Config:
             print(config.salt) # Will print the salt
         """
 
-        try:
-            return self.get_config()[name]
-        except KeyError:  # For values that don't exist in the config file
-            return None
+        return self.get(name)
@@ -1,6 +1,8 @@
 import base64
 import string
+from collections import OrderedDict
 from random import randint, choice
+from threading import Lock
 
 from Crypto.Cipher import AES
 from Crypto.Hash import SHA256
@@ -9,28 +11,175 @@ from Crypto import Random as CryptoRandom
 
 class Encryption():
 
-    def __init__(self, key):
+    # Encrypted field formats, the format used for new writes is set by the `keyVersion` setting
+    #  1: AES-256-CBC with PKCS7 padding, base 64 encoded (IV + ciphertext)
+    #  2: AES-256-GCM, `$2$` followed by base 64 encoded (nonce + tag + ciphertext)
+    # Both formats can also be stored as raw bytes, prefixed with the version byte
+    latest_version = 2
+
+    # Prefix of version 2 fields, `$` is not part of the base 64 alphabet
+    gcm_prefix = b'$2$'
+
+    # Version bytes of raw fields, they are not part of the base 64 alphabet either
+    raw_versions = (1, 2)
+
+    gcm_nonce_size = 12
+    gcm_tag_size = 16
+
+    def __init__(self, key, cache_size=8192, version=latest_version):
+        self.version = version  # Field format used to encrypt
+        self.key_cache = OrderedDict()  # Derived AES keys indexed by salt
+        self.cache_lock = Lock()  # The cache is shared between threads
+        self.cache_size = cache_size  # Max number of derived keys to keep
         self.key = key  # Key in bytes
+        self.data_key = None  # Optional vault data key, used for salted fields
+        self.salt = None  # Placeholder for optional salt
         self.salted_key = None  # Placeholder for optional salted key
+        self.decrypt_count = 0  # Number of fields decrypted
+
+    @property
+    def key(self):
+        """ `key` getter """
+
+        return self._key
+
+    @key.setter
+    def key(self, key):
+        """ `key` setter, derived keys are invalidated when the key changes """
+
+        self.clear_cache()
+        self._key = key
+
+    @property
+    def data_key(self):
+        """ `data_key` getter """
+
+        return self._data_key
+
+    @data_key.setter
+    def data_key(self, data_key):
+        """
+            `data_key` setter
+            When a data key is set, salted fields are encrypted with the data key
+            while unsalted values (like the validation key) still use the key
+        """
+
+        self.clear_cache()
+
+        # Wipe the previous data key
+        if getattr(self, '_data_key', None) is not None:
+            self.wipe(self._data_key)
+
+        self._data_key = bytearray(data_key) if data_key else None
+
+    def gen_data_key(self):
+        """
+            Generate a random data key
+        """
+
+        return CryptoRandom.new().read(32)
+
+    def get_wrap_key(self):
+        """
+            Return the key used to encrypt the data key, derived from the key
+        """
+
+        return bytearray(SHA256.new(b'data key' + self.key).digest())
+
+    def wrap(self, data_key):
+        """
+            Encrypt a data key with the key
+        """
+
+        wrap_key = self.get_wrap_key()
+        try:
+            return self.seal(wrap_key, self.gen_nonce(), data_key)
+        finally:
+            self.wipe(wrap_key)
+
+    def unwrap(self, wrapped_key):
+        """
+            Decrypt a data key encrypted with `wrap()`
+        """
+
+        wrap_key = self.get_wrap_key()
+        try:
+            return self.unseal(wrap_key, wrapped_key)
+        finally:
+            self.wipe(wrap_key)
 
     def digest_key(self):
         """
             Use SHA-256 over our key to get a proper-sized AES key
         """
 
-        # Add optional salt to key
-        key = self.key
-        if self.salted_key:
-            key = self.salted_key
+        return self.derive_key(self.salt)
+
+    def derive_key(self, salt=None):
+        """
+            Return the AES key derived from the key (or the data key) and an optional salt.
+            Derived keys are kept in a bounded LRU cache indexed by salt, callers get a copy
+            as cached keys are wiped when they are evicted
+        """
+
+        salt = salt or b''
+
+        with self.cache_lock:
+            # Cache hit: mark the key as recently used
+            derived = self.key_cache.get(salt)
+            if derived is not None:
+                self.key_cache.move_to_end(salt)
+                return bytes(derived)
+
+        hash_ = SHA256.new(salt)
+        hash_.update(self.data_key if salt and self.data_key else self.key)
+
+        # Stored as a `bytearray` so it can be wiped in place
+        derived = bytearray(hash_.digest())
+
+        if self.cache_size <= 0:
+            try:
+                return bytes(derived)
+            finally:
+                self.wipe(derived)
+
+        with self.cache_lock:
+            # Another thread may have derived the same key in the meantime
+            cached = self.key_cache.setdefault(salt, derived)
+            if cached is not derived:
+                self.wipe(derived)
+                return bytes(cached)
+
+            # Evict the least recently used key
+            if len(self.key_cache) > self.cache_size:
+                self.wipe(self.key_cache.popitem(last=False)[1])
+
+            return bytes(derived)
+
+    def clear_cache(self):
+        """
+            Zero and drop all derived keys
+        """
+
+        with self.cache_lock:
+            for derived in self.key_cache.values():
+                self.wipe(derived)
 
-        return SHA256.new(key).digest()
+            self.key_cache.clear()
+
+    def wipe(self, buffer):
+        """
+            Overwrite a mutable buffer with zeros
+        """
+
+        buffer[:] = bytes(len(buffer))
 
     def get_aes(self, IV):
         """
             AES instance
         """
 
-        return AES.new(self.digest_key(), AES.MODE_CBC, IV)
+        return AES.new(self.derive_key(self.salt), AES.MODE_CBC, IV)
 
     def gen_salt(self, set_=True):
         """
@@ -55,8 +204,10 @@ class Encryption():
         """
 
         if salt:
+            self.salt = salt
             self.salted_key = salt + self.key
         else:
+            self.salt = None
             self.salted_key = None
 
     def encrypt(self, secret):
@@ -64,11 +215,172 @@ class Encryption():
             Encrypt a secret
         """
 
-        # generate IV
-        IV = CryptoRandom.new().read(AES.block_size)
+        # Encrypt with the salted key
+        data = self.seal(self.derive_key(self.salt), self.gen_nonce(), secret)
+
+        # Reset salted key
+        self.set_salt()
+
+        return data
+
+    def decrypt(self, enc_secret):
+        """
+            Decrypt a secret
+        """
+
+        # Decrypt with the salted key
+        data = self.unseal(self.derive_key(self.salt), enc_secret)
+
+        # Reset salted key
+        self.set_salt()
+
+        return data
+
+    def encrypt_with_salt(self, salt, secret, raw=False):
+        """
+            Encrypt a secret with a salt
+            Unlike `encrypt()`, no state is shared so it is safe to call from multiple threads
+            Use `raw=True` to get raw bytes instead of base 64
+        """
+
+        return self.seal(self.derive_key(salt), self.gen_nonce(), secret, raw)
+
+    def decrypt_with_salt(self, salt, enc_secret):
+        """
+            Decrypt a secret with a salt
+            Unlike `decrypt()`, no state is shared so it is safe to call from multiple threads
+        """
+
+        return self.unseal(self.derive_key(salt), enc_secret)
+
+    def encrypt_many(self, items, raw=False):
+        """
+            Encrypt a sequence of `(salt, secret)` pairs
+            Returns the encrypted secrets in the same order
+            Use `raw=True` to get raw bytes instead of base 64
+        """
+
+        items = list(items)
+
+        # Read all IVs at once
+        size = self.get_nonce_size()
+        IVs = memoryview(CryptoRandom.new().read(size * len(items)))
+
+        return [self.seal(self.derive_key(salt), IVs[i * size:(i + 1) * size], secret, raw)
+                for i, (salt, secret) in enumerate(items)]
+
+    def decrypt_many(self, items):
+        """
+            Decrypt a sequence of `(salt, encrypted secret)` pairs
+            Returns the secrets in the same order
+        """
+
+        return [self.unseal(self.derive_key(salt), enc_secret)
+                for salt, enc_secret in items]
+
+    def get_nonce_size(self):
+        """
+            Return the IV or nonce size of the current field format
+        """
+
+        if self.version == 1:
+            return AES.block_size
+
+        return self.gcm_nonce_size
+
+    def gen_nonce(self):
+        """
+            Generate a random IV or nonce for the current field format
+        """
+
+        return CryptoRandom.new().read(self.get_nonce_size())
+
+    def seal(self, key, IV, secret, raw=False):
+        """
+            Encrypt a secret with the current field format
+        """
+
+        if self.version == 1:
+            data = self.cbc_encrypt(key, IV, secret)
+        elif self.version == 2:
+            data = self.gcm_encrypt(key, IV, secret)
+        else:
+            raise ValueError('Unsupported key version `%s`' % (self.version))
+
+        if raw:
+            return bytes([self.version]) + data
+        elif self.version == 1:
+            return base64.b64encode(data)
+
+        return self.gcm_prefix + base64.b64encode(data)
+
+    def unseal(self, key, enc_secret):
+        """
+            Decrypt a secret, the field format is detected from the data
+        """
+
+        self.decrypt_count += 1
+
+        version, data = self.unpack(enc_secret)
+
+        if version == 2:
+            return self.gcm_decrypt(key, data)
+
+        return self.cbc_decrypt(key, data)
+
+    def unpack(self, enc_secret):
+        """
+            Return the format version and the encrypted bytes of a raw or base 64 field
+        """
+
+        if enc_secret[:1] and enc_secret[0] in self.raw_versions:
+            return enc_secret[0], memoryview(enc_secret)[1:]
+        elif enc_secret.startswith(self.gcm_prefix):
+            return 2, base64.b64decode(enc_secret[len(self.gcm_prefix):])
+
+        return 1, base64.b64decode(enc_secret)
+
+    def to_raw(self, enc_secret):
+        """
+            Convert a base 64 field to the raw format, without decrypting it
+        """
+
+        version, data = self.unpack(enc_secret)
+
+        return bytes([version]) + bytes(data)
+
+    def gcm_encrypt(self, key, nonce, secret):
+        """
+            Encrypt and authenticate a secret with AES-GCM
+            The nonce and tag are stored at the beginning
+        """
 
-        # Retrieve AES instance
-        aes = self.get_aes(IV)
+        aes = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        data, tag = aes.encrypt_and_digest(secret)
+
+        return bytes(nonce) + tag + data
+
+    def gcm_decrypt(self, key, enc_secret):
+        """
+            Verify and decrypt a secret encrypted with `gcm_encrypt()`
+            Raises a `ValueError` if the key is invalid or the data was altered
+        """
+
+        enc_secret = memoryview(enc_secret)
+        tag_end = self.gcm_nonce_size + self.gcm_tag_size
+
+        aes = AES.new(key, AES.MODE_GCM,
+                      nonce=enc_secret[:self.gcm_nonce_size])
+
+        return aes.decrypt_and_verify(enc_secret[tag_end:],
+                                      enc_secret[self.gcm_nonce_size:tag_end])
+
+    def cbc_encrypt(self, key, IV, secret):
+        """
+            Pad and encrypt a secret with AES-CBC, the IV is stored at the beginning
+        """
+
+        aes = AES.new(key, AES.MODE_CBC, IV)
 
         # calculate needed padding
         padding = AES.block_size - len(secret) % AES.block_size
@@ -77,27 +389,17 @@ class Encryption():
         secret += bytes([padding]) * padding
 
         # store the IV at the beginning and encrypt
-        data = IV + aes.encrypt(secret)
+        return bytes(IV) + aes.encrypt(secret)
 
-        # Reset salted key
-        self.set_salt()
-
-        # Return base 64 encoded bytes
-        return base64.b64encode(data)
-
-    def decrypt(self, enc_secret):
+    def cbc_decrypt(self, key, enc_secret):
         """
-            Decrypt a secret
+            Decrypt a secret encrypted with `cbc_encrypt()` and remove the padding
         """
 
-        # Decode base 64
-        enc_secret = base64.b64decode(enc_secret)
+        enc_secret = memoryview(enc_secret)
 
         # extract the IV from the beginning
-        IV = enc_secret[:AES.block_size]
-
-        # Retrieve AES instance
-        aes = self.get_aes(IV)
+        aes = AES.new(key, AES.MODE_CBC, enc_secret[:AES.block_size])
 
         # Decrypt
         data = aes.decrypt(enc_secret[AES.block_size:])
@@ -109,8 +411,5 @@ class Encryption():
         if data[-padding:] != bytes([padding]) * padding:
             raise ValueError("Invalid padding...")
 
-        # Reset salted key
-        self.set_salt()
-
         # Remove the padding and return the bytes
         return data[:-padding]
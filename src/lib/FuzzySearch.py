@@ -0,0 +1,207 @@
+from array import array
+from collections import Counter
+import heapq
+import re
+
+
+class FuzzySearch():
+    """
+        Typo-tolerant search of secrets names, URLs and logins.
+        Candidates are found with an index of the trigrams of each word, then ranked by
+        edit distance, with a bonus for prefixes, and weighted by field.
+    """
+
+    # Length of the n-grams
+    n = 3
+
+    # Weights of the name, URL and login fields
+    weights = (3, 1, 2)
+
+    # Bonus for words starting with the query
+    prefix_bonus = 0.5
+
+    def __init__(self):
+        self.grams = {}  # n-gram => IDs of the secrets containing it
+
+    def get_tokens(self, value):
+        """
+            Split a value in lowercased words
+        """
+
+        return [token for token in re.split(r'\W+', (value or '').lower()) if token]
+
+    def get_grams(self, tokens):
+        """
+            Return the n-grams of a list of words. Words are padded with spaces so
+            their first and last letters are part of as many n-grams as the others.
+        """
+
+        grams = set()
+        for token in tokens:
+            padded = ' ' + token + ' '
+            grams.update(padded[i:i + self.n]
+                         for i in range(max(1, len(padded) - self.n + 1)))
+
+        return grams
+
+    def get_field_grams(self, fields):
+        """
+            Return the n-grams of all the fields of a secret
+        """
+
+        return self.get_grams([token for field in fields for token in self.get_tokens(field)])
+
+    def add(self, id_, fields):
+        """
+            Index a secret, `fields` are its name, URL and login
+        """
+
+        grams = self.grams
+        for gram in self.get_field_grams(fields):
+            postings = grams.get(gram)
+            if postings is None:
+                postings = grams[gram] = array('q')
+            postings.append(id_)
+
+        return True
+
+    def delete(self, id_, fields):
+        """
+            Remove a secret from the index, `fields` are its indexed name, URL and login
+        """
+
+        for gram in self.get_field_grams(fields):
+            postings = self.grams.get(gram)
+            if postings is not None and id_ in postings:
+                postings.remove(id_)
+                if not postings:
+                    del self.grams[gram]
+
+        return True
+
+    def get_max_typos(self, token):
+        """
+            Return the number of typos tolerated for a word
+        """
+
+        if len(token) < 4:
+            return 0
+        if len(token) < 8:
+            return 1
+
+        return 2
+
+    def get_candidates(self, tokens):
+        """
+            Return the IDs of the secrets sharing enough n-grams with the query to be within
+            the tolerated number of typos (one typo changes at most `n + 1` n-grams).
+            Words without tolerated typos may miss their last n-gram, to find longer words
+            they are the prefix of.
+        """
+
+        grams = self.get_grams(tokens)
+        missing = sum((self.n + 1) * self.get_max_typos(token) or 1 for token in tokens)
+        min_shared = max(1, len(grams) - missing)
+
+        counts = Counter()
+        for gram in grams:
+            postings = self.grams.get(gram)
+            if postings is not None:
+                counts.update(postings)
+
+        return [id_ for id_, count in counts.items() if count >= min_shared]
+
+    def edit_distance(self, a, b, max_distance):
+        """
+            Edit distance between `a` and `b`, or `max_distance + 1` if it is higher.
+            Insertions, deletions, substitutions and transpositions of two adjacent
+            characters count as one edit.
+        """
+
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+
+        before = None
+        previous = list(range(len(b) + 1))
+        for i, char_a in enumerate(a, 1):
+            current = [i]
+            for j, char_b in enumerate(b, 1):
+                distance = min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b))
+
+                # Transposition
+                if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                    distance = min(distance, before[j - 2] + 1)
+
+                current.append(distance)
+
+            # Stop early when every path is already too long
+            if min(current) > max_distance:
+                return max_distance + 1
+            before, previous = previous, current
+
+        return min(previous[-1], max_distance + 1)
+
+    def get_similarity(self, query, token):
+        """
+            Return the similarity of a query word and a word of a secret (0 if too different)
+        """
+
+        if token.startswith(query):
+            # Prefer the exact word to longer ones
+            return 1 + self.prefix_bonus - min(len(token) - len(query), 10) / 100
+
+        max_typos = self.get_max_typos(query)
+        if not max_typos:
+            return 0
+
+        # Compare with the whole word and with its beginning (for words still being typed)
+        distance = min(self.edit_distance(query, candidate, max_typos)
+                       for candidate in {token, token[:len(query)], token[:len(query) + 1]})
+        if distance > max_typos:
+            return 0
+
+        return 1 - distance / (len(query) + 1)
+
+    def get_score(self, tokens, fields):
+        """
+            Return the score of a secret for the query words (0 if a word is not found)
+        """
+
+        fields_tokens = [self.get_tokens(field) for field in fields]
+
+        score = 0
+        for query in tokens:
+            best = max((weight * self.get_similarity(query, token)
+                        for weight, field_tokens in zip(self.weights, fields_tokens)
+                        for token in field_tokens), default=0)
+            if best == 0:
+                return 0
+
+            score += best
+
+        return score
+
+    def search(self, query, get_fields, limit=10):
+        """
+            Return the IDs of the `limit` best matches, best first.
+            `get_fields(id_)` returns the name, URL and login of a secret.
+        """
+
+        tokens = self.get_tokens(query)
+        if not tokens:
+            return []
+
+        # Keep the best results in a heap of `limit` items
+        best = []
+        for id_ in self.get_candidates(tokens):
+            score = self.get_score(tokens, get_fields(id_))
+
+            if score > 0:
+                item = (score, -id_)  # Lower IDs first for equal scores
+                if len(best) < limit:
+                    heapq.heappush(best, item)
+                else:
+                    heapq.heappushpop(best, item)
+
+        return [-id_ for score, id_ in sorted(best, reverse=True)]
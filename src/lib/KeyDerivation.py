@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+
+class KeyDerivation():
+
+    # Iterations used to measure the machine speed
+    sample_iterations = 20000
+
+    # Lower bound for calibrated iterations
+    min_iterations = 100000
+
+    def __init__(self, iterations=None):
+        self.iterations = iterations  # PBKDF2 iterations, `None` for legacy vaults
+
+    def derive(self, key, salt):
+        """
+            Derive a 32 bytes key from the master key and the config salt
+            with PBKDF2-HMAC-SHA256
+        """
+
+        # Legacy vaults: single SHA-256
+        if not self.iterations:
+            return hashlib.sha256(key + salt).digest()
+
+        return hashlib.pbkdf2_hmac('sha256', key, salt, self.iterations)
+
+    def measure(self, iterations):
+        """
+            Return the time (in seconds) taken to derive a key with a given number of iterations
+        """
+
+        start = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'key', b'salt', iterations)
+
+        return time.perf_counter() - start
+
+    def calibrate(self, unlock_time=250):
+        """
+            Benchmark the machine and return the number of iterations
+            needed to derive a key in `unlock_time` milliseconds
+        """
+
+        # Keep the fastest of a few runs to ignore scheduling noise
+        elapsed = min(self.measure(self.sample_iterations) for i in range(3))
+
+        iterations = int(self.sample_iterations * unlock_time / 1000 / elapsed)
+
+        return max(iterations, self.min_iterations)
@@ -0,0 +1,81 @@
+import re
+
+
+class SearchQuery():
+    """
+        Search query made of terms, optionally restricted to a field:
+        `login:alice cat:infra url:*.corp.example name:^db`
+
+        Term values are matched case-insensitively:
+            `value`     contains `value`
+            `^value`    starts with `value`
+            `=value`    is `value`
+            `va*ue`     matches the pattern, `*` being any characters
+        Values with spaces are quoted: `name:"my bank"`
+    """
+
+    # Query prefix => searched field
+    fields = {
+        'name': 'name',
+        'login': 'login',
+        'url': 'url',
+        'cat': 'category',
+        'category': 'category',
+    }
+
+    term_pattern = re.compile(r'(?:(\w+):)?("[^"]*"|\S+)')
+
+    def __init__(self, query):
+        self.terms = self.parse(query)
+
+    def parse(self, query):
+        """
+            Return the terms of a query as tuples: (field or `None` for all fields, operator, value)
+        """
+
+        terms = []
+        for match in self.term_pattern.finditer(str(query)):
+            field, value = match.groups()
+
+            # Unknown prefixes are part of the value (`https://...`)
+            if field is not None:
+                if field.lower() in self.fields:
+                    field = self.fields[field.lower()]
+                else:
+                    field, value = None, match.group(0)
+
+            term = self.parse_value(value)
+            if term:
+                terms.append((field,) + term)
+
+        return terms
+
+    def parse_value(self, value):
+        """
+            Return the operator and value of a term, or `None` if the value is empty
+        """
+
+        if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+            value = value[1:-1]
+
+        if value.startswith('^'):
+            operator, value = 'prefix', value[1:]
+        elif value.startswith('='):
+            operator, value = 'equals', value[1:]
+        elif '*' in value:
+            operator = 'pattern'
+        else:
+            operator = 'contains'
+
+        if not value.replace('*', ''):
+            return None
+
+        return (operator, value)
+
+    def is_qualified(self):
+        """
+            Return `True` if the query restricts a term to a field or uses an operator
+        """
+
+        return any(field is not None or operator != 'contains'
+                   for field, operator, value in self.terms)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index, text
 
 from .base import Base
 
@@ -10,6 +10,12 @@ class CategoryModel(Base):
     name = Column(String)
     active = Column(Integer, default=1)
 
+    __table_args__ = (
+        Index('ix_categories_name', 'name'),
+        # Case-insensitive searches
+        Index('ix_categories_name_nocase', text('name COLLATE NOCASE')),
+    )
+
     def __repr__(self):
         return "<CategoryModel(id='%s', name='%s', active='%d')>" % (
             self.id, self.name, self.active)
@@ -1,7 +1,13 @@
-from sqlalchemy import Column, Integer, String, BLOB
+from weakref import WeakSet
+
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, DDL, event, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship
 
-from .base import Base
+from .base import Base, get_session
+from .Category import CategoryModel
+from .SecretPayload import SecretPayloadModel
 from ..modules.carry import global_scope
 
 
@@ -12,10 +18,29 @@ class SecretModel(Base):
     name = Column(String)
     url = Column(String)
     login = Column(String)
-    _password = Column(String)
-    _notes = Column(BLOB)
-    _salt = Column(String)
-    category_id = Column(Integer)
+    category_id = Column(Integer, ForeignKey('categories.id'))
+
+    # Loaded with the secret, in the same query
+    category = relationship(CategoryModel, lazy='joined')
+
+    # Encrypted fields and their salt, loaded when they are read (or with `joinedload(SecretModel.payload)`).
+    # Payloads are deleted by a trigger when their secret is deleted.
+    payload = relationship(SecretPayloadModel, uselist=False, cascade='all, delete-orphan',
+                           passive_deletes=True)
+
+    __table_args__ = (
+        Index('ix_secrets_name', 'name'),
+        Index('ix_secrets_login', 'login'),
+        Index('ix_secrets_url', 'url'),
+        Index('ix_secrets_category_id', 'category_id'),
+        # Case-insensitive variants, used by `LIKE 'prefix%'` searches
+        Index('ix_secrets_name_nocase', text('name COLLATE NOCASE')),
+        Index('ix_secrets_login_nocase', text('login COLLATE NOCASE')),
+        Index('ix_secrets_url_nocase', text('url COLLATE NOCASE')),
+    )
+
+    # Secrets holding decrypted fields, they are forgotten when the vault is locked
+    decrypted = WeakSet()
 
     def __init__(self, name, url='', login='', password='', notes='', category_id=None):
         # Set class level vars
@@ -23,15 +48,67 @@ class SecretModel(Base):
         self.name = name
         self.url = url
         self.login = login
-        self.password = password
-        self.notes = notes
         self.category_id = category_id
 
+        # Passwords and notes can be left to `None` to be encrypted in batch with `encrypt_many()`
+        if password is not None:
+            self.password = password
+        if notes is not None:
+            self.notes = notes
+
     def __repr__(self):
         return "<SecretModel(id='%s', name='%s', login='%s', salt='%s')>" % (
             self.id, self.name, self.login, self._salt)
 
-    def get_enc(self):
+    def get_payload(self):
+        """ Return the encrypted fields of the secret, created for new secrets """
+
+        if self.payload is None:
+            self.payload = SecretPayloadModel()
+
+        return self.payload
+
+    @property
+    def _password(self):
+        """ Encrypted password """
+
+        return self.get_payload()._password
+
+    @_password.setter
+    def _password(self, value):
+        self.get_payload()._password = value
+
+    @property
+    def _notes(self):
+        """ Encrypted notes """
+
+        return self.get_payload()._notes
+
+    @_notes.setter
+    def _notes(self, value):
+        self.get_payload()._notes = value
+
+    @property
+    def _salt(self):
+        """ Salt of the encrypted fields """
+
+        return self.get_payload()._salt
+
+    @_salt.setter
+    def _salt(self, value):
+        self.get_payload()._salt = value
+
+    @property
+    def category_name(self):
+        """ Name of the category, empty if there is none or it was deleted """
+
+        if self.category is None or not self.category.active:
+            return ''
+
+        return self.category.name
+
+    @staticmethod
+    def get_enc():
         """ Returns a shared instance of Encryption class """
 
         if global_scope['enc'] is None:
@@ -49,32 +126,171 @@ class SecretModel(Base):
     def salt(self, void=''):
         """ `salt` setter """
 
-        self._salt = self.get_enc().gen_salt()
+        self.forget_decrypted()
+        self._salt = self.get_enc().gen_salt(set_=False)
 
     @hybrid_property
     def password(self):
         """ `password` getter """
 
-        self.get_enc().set_salt(self.salt)
-        return self.get_enc().decrypt(self._password).decode('utf-8')
+        return self.get_decrypted('password')
 
     @password.setter
     def password(self, password):
         """ `password` setter """
 
-        self.get_enc().set_salt(self.salt)
-        self._password = self.get_enc().encrypt(password.encode())
+        self.forget_decrypted()
+        self._password = self.get_enc().encrypt_with_salt(
+            self.salt, password.encode(), raw=True)
 
     @hybrid_property
     def notes(self):
         """ `notes` getter """
 
-        self.get_enc().set_salt(self.salt)
-        return self.get_enc().decrypt(self._notes).decode('utf-8')
+        return self.get_decrypted('notes')
 
     @notes.setter
     def notes(self, notes):
         """ `notes` setter """
 
-        self.get_enc().set_salt(self.salt)
-        self._notes = self.get_enc().encrypt(notes.encode())
+        self.forget_decrypted()
+        self._notes = self.get_enc().encrypt_with_salt(
+            self.salt, notes.encode(), raw=True)
+
+    def get_decrypted(self, field):
+        """
+            Return a decrypted field, each field is decrypted once until the secret
+            is changed or expired
+        """
+
+        cache = self.__dict__.get('_decrypted')
+
+        if cache is None or field not in cache:
+            # Read the encrypted field first, loading it can expire the decrypted fields
+            value = self.get_enc().decrypt_with_salt(
+                self.salt, getattr(self, '_' + field)).decode('utf-8')
+
+            cache = self.__dict__.setdefault('_decrypted', {})
+            cache[field] = value
+            self.decrypted.add(self)
+
+        return cache[field]
+
+    def forget_decrypted(self, *args):
+        """
+            Drop the decrypted fields of the secret
+        """
+
+        self.__dict__.pop('_decrypted', None)
+        self.decrypted.discard(self)
+
+    @classmethod
+    def forget_all_decrypted(cls):
+        """
+            Drop the decrypted fields of all secrets
+        """
+
+        for secret in list(cls.decrypted):
+            secret.forget_decrypted()
+
+    @classmethod
+    def decrypt_many(cls, secrets, enc=None):
+        """
+            Decrypt passwords and notes of many secrets in one batch
+            Returns a list of `(password, notes)` tuples
+        """
+
+        enc = enc or cls.get_enc()
+
+        fields = enc.decrypt_many((secret.salt, value)
+                                  for secret in secrets
+                                  for value in (secret._password, secret._notes))
+
+        return [(fields[i].decode('utf-8'), fields[i + 1].decode('utf-8'))
+                for i in range(0, len(fields), 2)]
+
+    @classmethod
+    def encrypt_many(cls, secrets, values, enc=None):
+        """
+            Encrypt passwords and notes of many secrets in one batch
+            `values` is a list of `(password, notes)` tuples
+        """
+
+        enc = enc or cls.get_enc()
+
+        fields = enc.encrypt_many(((secret.salt, value.encode())
+                                   for secret, pair in zip(secrets, values)
+                                   for value in pair), raw=True)
+
+        for i, secret in enumerate(secrets):
+            secret.forget_decrypted()
+            secret._password = fields[i * 2]
+            secret._notes = fields[i * 2 + 1]
+
+
+# Decrypted fields are read again once the secret is expired (after a commit) or refreshed
+event.listen(SecretModel, 'expire', SecretModel.forget_decrypted)
+event.listen(SecretModel, 'refresh', SecretModel.forget_decrypted)
+
+
+# Whether the SQLite library has FTS5 and its trigram tokenizer (SQLite 3.34+), see `supports_search_index()`
+trigram_support = None
+
+# Vault file => whether the vault has the full-text search index, see `has_search_index()`
+search_indexes = {}
+
+
+def supports_search_index(bind):
+    """
+        Return whether the full-text search index can be created, the SQLite library is probed once
+    """
+
+    global trigram_support
+
+    if trigram_support is None:
+        try:
+            bind.execute("CREATE VIRTUAL TABLE temp.secrets_fts_probe USING fts5(name, tokenize='trigram')")
+            bind.execute('DROP TABLE temp.secrets_fts_probe')
+            trigram_support = True
+        except OperationalError:
+            trigram_support = False
+
+    return trigram_support
+
+
+def has_search_index():
+    """
+        Return whether the current vault has the full-text search index.
+        Vaults created with a SQLite library without trigrams do not have it, they are searched with LIKE.
+    """
+
+    db_file = global_scope['db_file']
+
+    if db_file not in search_indexes:
+        search_indexes[db_file] = get_session().execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'secrets_fts'").scalar() > 0
+
+    return search_indexes[db_file]
+
+
+# Full-text search index of names, URLs and logins (FTS5 with trigrams, to match substrings).
+# The index does not store a copy of the columns and is kept in sync with triggers.
+# It is skipped when the SQLite library does not support it.
+search_ddl = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS secrets_fts USING fts5(
+        name, url, login, content='secrets', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS secrets_fts_insert AFTER INSERT ON secrets BEGIN
+        INSERT INTO secrets_fts(rowid, name, url, login) VALUES (new.id, new.name, new.url, new.login);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS secrets_fts_delete AFTER DELETE ON secrets BEGIN
+        INSERT INTO secrets_fts(secrets_fts, rowid, name, url, login) VALUES ('delete', old.id, old.name, old.url, old.login);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS secrets_fts_update AFTER UPDATE OF name, url, login ON secrets BEGIN
+        INSERT INTO secrets_fts(secrets_fts, rowid, name, url, login) VALUES ('delete', old.id, old.name, old.url, old.login);
+        INSERT INTO secrets_fts(rowid, name, url, login) VALUES (new.id, new.name, new.url, new.login);
+    END""",
+]
+
+for statement in search_ddl:
+    event.listen(SecretModel.__table__, 'after_create', DDL(statement).execute_if(
+        callable_=lambda ddl, target, bind, **kw: supports_search_index(bind)))
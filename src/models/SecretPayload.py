@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, BLOB, ForeignKey, DDL, event
+
+from .base import Base
+
+
+class SecretPayloadModel(Base):
+    """
+        Encrypted fields of a secret, stored apart from the fields listed and searched
+        so that the `secrets` table stays small
+    """
+
+    __tablename__ = 'secret_payloads'
+
+    id = Column(Integer, ForeignKey('secrets.id'), primary_key=True)
+    _password = Column(BLOB)
+    _notes = Column(BLOB)
+    _salt = Column(String)
+
+    def __repr__(self):
+        return "<SecretPayloadModel(id='%s', salt='%s')>" % (self.id, self._salt)
+
+
+# Payloads are deleted with their secret, including by bulk deletes
+payload_ddl = [
+    """CREATE TRIGGER IF NOT EXISTS secret_payloads_delete AFTER DELETE ON secrets BEGIN
+        DELETE FROM secret_payloads WHERE id = old.id;
+    END""",
+]
+
+for statement in payload_ddl:
+    event.listen(SecretPayloadModel.__table__, 'after_create', DDL(statement))
@@ -1,15 +1,18 @@
 import os
-from hashlib import sha256
 
-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import as_declarative
 from sqlalchemy.orm import Session
 
 from ..modules.carry import global_scope
+from ..lib.KeyDerivation import KeyDerivation
 
 
 sessions = {}
+engines = {}
+
+# Number of database connections opened since start, see `count_connection()`
+connections_opened = 0
 
 
 @as_declarative()
@@ -43,12 +46,20 @@ def get_session():
 
 def drop_sessions():
     """
-        Drop current db sessions
+        Drop current db sessions and dispose their engines,
+        closing the connections opened with the current key
     """
 
-    global sessions
+    global sessions, engines
+
+    for session in sessions.values():
+        session.close()
+
+    for engine in engines.values():
+        engine.dispose()
 
     sessions = {}
+    engines = {}
 
     return True
 
@@ -56,20 +67,57 @@ def drop_sessions():
 def get_engine(encrypted=True):
     """
         return SQLAlchemy engine
+        Encrypted engines are created once per vault and reused until `drop_sessions()`
     """
 
     if global_scope['db_file'] is None:
         raise RuntimeError('`db_file` is not defined in the global scope')
 
     if encrypted:
-        return create_engine('sqlite+pysqlcipher://:' + get_db_key() + '@' + get_slashes() + global_scope['db_file'])
+        # Create a unique key for the db engine
+        db_file = global_scope['db_file']
+
+        if not engines.get(db_file):
+            engines[db_file] = create_encrypted_engine()
+
+        return engines[db_file]
     else:
-        return create_engine('sqlite:' + get_slashes() + global_scope['db_file'])
+        engine = create_engine('sqlite:' + get_slashes() + global_scope['db_file'])
+        event.listen(engine, 'connect', count_connection)
+
+        return engine
+
+
+def create_encrypted_engine():
+    """
+        Create a SQLAlchemy engine for the encrypted vault
+    """
+
+    engine = create_engine('sqlite+pysqlcipher://:' + get_db_passphrase() + '@' + get_slashes() + global_scope['db_file'],
+                           connect_args=get_cipher_settings())
+    event.listen(engine, 'connect', count_connection)
+
+    # Page cache size is a per-connection setting
+    if global_scope['conf'].cacheSize:
+        event.listen(engine, 'connect', set_cache_size)
+
+    return engine
+
+
+def count_connection(dbapi_connection, connection_record):
+    """
+        Count database connections, each one of them derives the SQLCipher key
+    """
+
+    global connections_opened
 
+    connections_opened += 1
 
-def get_db_key():
+
+def get_db_key(iterations=None):
     """
         Prepare and return database encryption password
+        `iterations` overrides the key derivation parameters saved in the config file
     """
 
     if global_scope['enc'] is None:
@@ -78,8 +126,51 @@ def get_db_key():
     if global_scope['conf'] is None:
         raise RuntimeError('`conf` is not defined in the global scope')
 
-    # Retrieve key
-    return sha256(global_scope['enc'].key + global_scope['conf'].salt.encode()).hexdigest()
+    # Derive the key with the parameters saved in the config file
+    if iterations is None:
+        iterations = global_scope['conf'].kdfIterations or 0
+    kdf = KeyDerivation(iterations)
+
+    return kdf.derive(global_scope['enc'].key, global_scope['conf'].salt.encode()).hex()
+
+
+def get_db_passphrase(iterations=None, raw_key=None):
+    """
+        Return the key given to SQLCipher.
+        In raw key mode the derived key is used as-is (`x'...'`) and SQLCipher
+        skips its own key derivation, otherwise it is used as a passphrase.
+    """
+
+    if raw_key is None:
+        raw_key = bool(global_scope['conf'].rawKey)
+
+    if raw_key:
+        return "x'%s'" % (get_db_key(iterations))
+
+    return get_db_key(iterations)
+
+
+def get_cipher_settings():
+    """
+        Return the SQLCipher settings applied by the dialect after the key on each connection
+    """
+
+    settings = {
+        'kdf_iter': global_scope['conf'].cipherKdfIter,
+        'cipher_page_size': global_scope['conf'].cipherPageSize,
+    }
+
+    # Settings set to 0 keep the SQLCipher defaults
+    return {name: value for name, value in settings.items() if value}
+
+
+def set_cache_size(dbapi_connection, connection_record):
+    """
+        Apply the page cache size setting to a new connection
+    """
+
+    dbapi_connection.execute(
+        'PRAGMA cache_size = %d' % (global_scope['conf'].cacheSize))
 
 
 def get_slashes(encrypted=True):
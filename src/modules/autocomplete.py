@@ -1,3 +1,4 @@
+from bisect import bisect_left
 import re
 import readline
 
@@ -10,34 +11,64 @@ import readline
 completion_list = ['one', 'two', 'thee']
 is_case_sensitive = True
 
+# Prebuilt by `set_parameters()`: suggestions as they are matched (lowercased if the completion
+# is case-insensitive), the same suggestions sorted, and the position of each sorted suggestion
+folded_list = completion_list
+sorted_list = sorted(completion_list)
+sorted_positions = sorted(range(len(completion_list)), key=completion_list.__getitem__)
+
+# Last line buffer completed and its results, readline asks for each result with the same buffer
+last_buffer = None
+last_results = []
+
 
 def set_parameters(list_, case_sensitive=True):
     """ Set module parameters """
 
-    global completion_list, is_case_sensitive
+    global completion_list, is_case_sensitive, folded_list, sorted_list, sorted_positions, last_buffer
 
     completion_list = list_
     is_case_sensitive = case_sensitive
 
+    folded_list = list_ if case_sensitive else [c.lower() for c in list_]
+    sorted_positions = sorted(range(len(folded_list)), key=folded_list.__getitem__)
+    sorted_list = [folded_list[position] for position in sorted_positions]
+    last_buffer = None
 
-def autocomplete(text, state):
-    """ Generic readline completion entry point. """
 
-    buffer = readline.get_line_buffer()
+def get_results(buffer):
+    """ Return the suggestions starting with `buffer`, in the order of the completion list """
 
-    comp = completion_list
-    if not is_case_sensitive:
-        buffer = buffer.lower()
-        comp = [c.lower() for c in completion_list]
+    # Suggestions starting with the buffer are next to each other in the sorted list
+    start = stop = bisect_left(sorted_list, buffer)
+    while stop < len(sorted_list) and sorted_list[stop].startswith(buffer):
+        stop += 1
 
-    results = [c for c in comp if c.startswith(buffer)] + [None]
+    results = [folded_list[position] for position in sorted(sorted_positions[start:stop])]
 
     # Handle multi-word inputs by truncating strings at the last space
     if buffer.find(' ') > 0:
         strip_pos = buffer.rfind(' ') + 1
-        results = [i[strip_pos:] for i in results if i is not None] + [None]
+        results = [i[strip_pos:] for i in results]
+
+    return results + [None]
+
+
+def autocomplete(text, state):
+    """ Generic readline completion entry point. """
+
+    global last_buffer, last_results
+
+    buffer = readline.get_line_buffer()
+    if not is_case_sensitive:
+        buffer = buffer.lower()
+
+    # Results are computed once per buffer, then read for each state
+    if buffer != last_buffer:
+        last_results = get_results(buffer)
+        last_buffer = buffer
 
-    return results[state]
+    return last_results[state]
 
 
 def get_input_autocomplete(message=''):
@@ -7,4 +7,7 @@ global_scope = {
     'enc': None,  # Encryption instance
     'db_file': None,  # Database path
     'conf': None,  # Config instance
+    'catalog': None,  # In-memory catalog of secrets, built when the vault is unlocked
+    'categories': None,  # In-memory map of categories names by ID, built when the vault is unlocked
+    'category_ids': None,  # In-memory map of categories IDs by name, built with `categories`
 }
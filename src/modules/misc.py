@@ -79,9 +79,13 @@ def erase_vault(vault_path, config_path):
 
     import os
     import sys
+    from ..models.base import drop_sessions
 
     print()
     if confirm(prompt='Do you want to permanently erase your vault? All your data will be lost!', resp=False):
+        # Close open connections to the vault
+        drop_sessions()
+
         # Delete files
         if os.path.isfile(vault_path):
             os.remove(vault_path)
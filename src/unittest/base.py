@@ -2,7 +2,7 @@ import unittest
 import tempfile
 import uuid
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from ..models.base import Base, get_session, get_engine
 from ..models.User import UserModel
@@ -22,6 +22,11 @@ class BaseTest(unittest.TestCase):
         cls.secret_key = str(uuid.uuid4())
         cls.enc = global_scope['enc'] = Encryption(cls.secret_key.encode())
 
+        # Secrets and categories are read from the database until their cache is built
+        global_scope['catalog'] = None
+        global_scope['categories'] = None
+        global_scope['category_ids'] = None
+
         # Load config
         cls.conf_path = tempfile.TemporaryDirectory()
         cls.config = Config(cls.conf_path.name + '/config')
@@ -54,6 +59,36 @@ class BaseTest(unittest.TestCase):
         cls.session.add(user)
         cls.session.commit()
 
+    def get_statements(self, func, *args, **kwargs):
+        """
+            Call `func` and return the statements and parameters it sent to the vault session
+        """
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        engine = get_session().get_bind()
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            func(*args, **kwargs)
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+        return statements
+
+    def query_plans(self, func, *args, **kwargs):
+        """
+            Call `func` and return the query plans of the statements it sent to the vault session
+        """
+
+        statements = self.get_statements(func, *args, **kwargs)
+
+        connection = get_session().connection().connection
+        return [' / '.join(row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters))
+                for statement, parameters in statements]
+
     @classmethod
     def tearDownClass(cls):
         # cls.session.remove()
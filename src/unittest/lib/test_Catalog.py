@@ -0,0 +1,120 @@
+from ..base import BaseTest
+from ...lib.Catalog import Catalog, CatalogRow
+
+
+class Test(BaseTest):
+
+    def setUp(self):
+        self.catalog = Catalog([
+            (1, 'Paypal', 'https://www.paypal.com', 'gab@gmail.com', 1),
+            (2, 'Gmail', 'https://www.gmail.com', 'gab@gmail.com', None),
+            (4, '', 'https://www.ebay.com', 'gab2@gmail.com', 2),
+        ])
+
+    def test_len(self):
+        self.assertEqual(len(self.catalog), 3)
+
+    def test_get_position(self):
+        self.assertEqual(self.catalog.get_position(4), 2)
+        self.assertIsNone(self.catalog.get_position(3))
+        self.assertIsNone(self.catalog.get_position(5))
+
+    def test_get(self):
+        row = self.catalog.get(1)
+        self.assertIsInstance(row, CatalogRow)
+        self.assertEqual((row.id, row.name, row.url, row.login, row.category_id),
+                         (1, 'Paypal', 'https://www.paypal.com', 'gab@gmail.com', 1))
+        self.assertIsNone(self.catalog.get(2).category_id)
+        self.assertIsNone(self.catalog.get(3))
+
+    def test_add(self):
+        self.assertTrue(self.catalog.add(5, 'Github', '', 'gab', None))
+        self.assertEqual(self.catalog.get(5).name, 'Github')
+
+        # Rows are kept sorted by ID
+        self.catalog.add(3, 'Amazon', '', '', None)
+        self.assertEqual(list(self.catalog.ids), [1, 2, 3, 4, 5])
+
+    def test_update(self):
+        self.assertTrue(self.catalog.update(2, 'Google', 'https://google.com', 'gab', 3))
+        row = self.catalog.get(2)
+        self.assertEqual((row.name, row.url, row.login, row.category_id),
+                         ('Google', 'https://google.com', 'gab', 3))
+        self.assertEqual(self.catalog.search('www.gmail'), [])
+
+    def test_update_2(self):
+        # Unknown secrets are added
+        self.assertTrue(self.catalog.update(5, 'Github', '', '', None))
+        self.assertEqual(len(self.catalog), 4)
+
+    def test_delete(self):
+        self.assertTrue(self.catalog.delete(2))
+        self.assertIsNone(self.catalog.get(2))
+        self.assertEqual(self.catalog.get(4).url, 'https://www.ebay.com')
+        self.assertFalse(self.catalog.delete(2))
+
+    def test_all(self):
+        self.assertEqual([row.id for row in self.catalog.all()], [1, 2, 4])
+
+    def test_get_rows(self):
+        self.assertEqual([row.id for row in self.catalog.get_rows(1, 3)], [2, 4])
+        self.assertEqual([row.id for row in self.catalog.get_rows(2, 10)], [4])
+        self.assertEqual(self.catalog.get_rows(3, 5), [])
+
+    def test_search(self):
+        self.assertEqual([row.id for row in self.catalog.search('YPA')], [1])
+        self.assertEqual([row.id for row in self.catalog.search('gab@')], [1, 2])
+        self.assertEqual([row.id for row in self.catalog.search('.com')], [1, 2, 4])
+        self.assertEqual(self.catalog.search('amazon'), [])
+
+    def test_search_2(self):
+        # Rows are only returned once, and the index follows changes
+        self.assertEqual([row.id for row in self.catalog.search('m')], [1, 2, 4])
+        self.catalog.update(2, 'Google', 'https://google.com', 'gab', None)
+        self.assertEqual([row.id for row in self.catalog.search('goo')], [2])
+        self.catalog.delete(1)
+        self.assertEqual([row.id for row in self.catalog.search('ebay')], [4])
+
+    def test_search_3(self):
+        self.assertEqual(Catalog().search(''), [])
+
+    def test_get_category_count(self):
+        self.assertEqual(self.catalog.get_category_count(1), 1)
+        self.assertEqual(self.catalog.get_category_count(None), 1)
+        self.assertEqual(self.catalog.get_category_count(3), 0)
+
+    def test_get_category_count_2(self):
+        # Counts follow changes
+        self.catalog.add(5, 'Github', '', '', 2)
+        self.catalog.update(1, 'Paypal', '', '', 2)
+        self.catalog.update(2, 'Gmail', '', '', 3)
+        self.catalog.delete(4)
+        self.assertEqual(dict(self.catalog.category_counts), {2: 2, 3: 1})
+
+    def test_get_names(self):
+        self.assertEqual(self.catalog.get_names(), ['Paypal', 'Gmail'])
+        self.assertEqual(self.catalog.get_names(limit=1), ['Paypal'])
+
+    def test_get_size(self):
+        size = self.catalog.get_size()
+        self.assertIsInstance(size, int)
+
+        self.catalog.add(5, 'x' * 1000, '', '', None)
+        self.assertGreater(self.catalog.get_size(), size + 2000)
+
+    def test_search_fuzzy(self):
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('paypl')], [1])
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('gmial')], [2, 1, 4])
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('gmial', limit=1)], [2])
+        self.assertEqual(self.catalog.search_fuzzy('amazon'), [])
+
+    def test_search_fuzzy_2(self):
+        # The n-gram index follows changes
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('ebya')], [4])
+        self.catalog.add(5, 'Amazon', '', '', None)
+        self.catalog.update(2, 'Google', 'https://google.com', 'gab', None)
+        self.catalog.delete(4)
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('amazn')], [5])
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('gogle')], [2])
+        self.assertEqual(self.catalog.search_fuzzy('ebya'), [])
+        self.assertEqual([row.id for row in self.catalog.search_fuzzy('gmail.com')], [1])
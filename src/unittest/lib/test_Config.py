@@ -1,4 +1,5 @@
 import tempfile
+from unittest.mock import patch
 import configparser
 
 from ..base import BaseTest
@@ -26,6 +27,23 @@ class Test(BaseTest):
         self.assertEqual(retrieved['some_name'], 'some_value')
         self.assertTrue(retrieved)
 
+    def test_update_2(self):
+        with patch('builtins.print') as patched:
+            self.config.update('some_name', 'some_value', quiet=True)
+            patched.assert_not_called()
+        self.assertEqual(self.config.some_name, 'some_value')
+
+    def test_update_many(self):
+        self.assertTrue(self.config.update_many({'some_name': 'some_value', 'cacheSize': 1000}))
+        self.assertEqual(self.config.some_name, 'some_value')
+        self.assertEqual(self.config.cacheSize, 1000)
+
+        # Values are left unchanged when they cannot be saved
+        with patch.object(self.config, 'save_config', side_effect=OSError()):
+            self.assertRaises(OSError, self.config.update_many, {'cacheSize': 2000, 'other_name': 'value'})
+        self.assertEqual(self.config.cacheSize, 1000)
+        self.assertIsNone(self.config.other_name)
+
     def test_save_config(self):
         self.config.get_config()
         self.assertTrue(self.config.save_config())
@@ -38,3 +56,32 @@ class Test(BaseTest):
 
     def test_getattr_2(self):
         self.assertIsNone(self.config.some_invalid_value)
+
+    def test_getattr_3(self):
+        # Typed values
+        self.assertEqual(self.config.autoLockTTL, 900)
+        self.assertIs(self.config.encryptedDb, True)
+        self.assertEqual(self.config.version, '2.00')
+
+    def test_get_config_2(self):
+        # The file is parsed once
+        self.config.get_config()
+        with patch('configparser.ConfigParser.read') as patched:
+            self.assertEqual(self.config.salt, self.config.salt)
+            self.assertEqual(self.config.autoLockTTL, 900)
+        patched.assert_not_called()
+
+    def test_get_config_3(self):
+        # The file is read again when it is modified by another instance
+        other = Config(self.config.config_path)
+        other.update('autoLockTTL', 60, quiet=True)
+        self.assertEqual(self.config.autoLockTTL, 60)
+
+        self.config.update('autoLockTTL', 30, quiet=True)
+        self.assertEqual(other.autoLockTTL, 30)
+
+    def test_config_per_instance(self):
+        other = Config(tempfile.NamedTemporaryFile().name)
+        other.update('some_name', 'some_value', quiet=True)
+        self.assertIsNot(other.config, self.config.config)
+        self.assertIsNone(self.config.some_name)
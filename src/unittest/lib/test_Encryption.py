@@ -1,7 +1,11 @@
+import base64
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
 from Crypto import Cipher
 from Crypto.Cipher import AES
+from Crypto.Hash import SHA256
 from Crypto import Random as CryptoRandom
 
 from ..base import BaseTest
@@ -79,3 +83,212 @@ class Test(BaseTest):
         self.enc2.set_salt(salt)
         encrypted = self.enc2.encrypt(secret_string)
         self.assertRaises(ValueError, self.enc2.decrypt, encrypted)
+
+    def test_derive_key(self):
+        salt = self.enc2.gen_salt()
+        dk = self.enc2.derive_key(salt)
+        self.assertIsInstance(dk, bytes)
+        self.assertEqual(dk, self.enc2.digest_key())
+
+        # A second call is served from the cache
+        with patch.object(SHA256, 'new') as patched:
+            self.assertEqual(self.enc2.derive_key(salt), dk)
+        patched.assert_not_called()
+
+    def test_derive_key_2(self):
+        # The least recently used key is evicted and wiped
+        enc = Encryption(self.key, cache_size=2)
+        dk = enc.derive_key(b'salt1')
+        cached = enc.key_cache[b'salt1']
+        enc.derive_key(b'salt2')
+        enc.derive_key(b'salt3')
+        self.assertEqual(list(enc.key_cache), [b'salt2', b'salt3'])
+        self.assertEqual(cached, bytearray(32))
+
+        # Keys returned before are copies, they are not wiped
+        self.assertEqual(dk, Encryption(self.key).derive_key(b'salt1'))
+        self.assertNotEqual(dk, bytes(32))
+
+    def test_derive_key_3(self):
+        # Caching disabled
+        enc = Encryption(self.key, cache_size=0)
+        enc.derive_key(b'salt1')
+        self.assertEqual(len(enc.key_cache), 0)
+
+    def test_clear_cache(self):
+        dk = self.enc2.derive_key(b'salt1')
+        cached = self.enc2.key_cache[b'salt1']
+        self.enc2.clear_cache()
+        self.assertEqual(len(self.enc2.key_cache), 0)
+        self.assertEqual(cached, bytearray(32))
+        self.assertNotEqual(dk, bytes(32))
+
+    def test_setter_key(self):
+        # Changing the key invalidates derived keys
+        dk = bytes(self.enc2.derive_key(b'salt1'))
+        self.enc2.key = b'some other key'
+        self.assertEqual(len(self.enc2.key_cache), 0)
+        self.assertNotEqual(bytes(self.enc2.derive_key(b'salt1')), dk)
+
+    def test_encrypt_many(self):
+        items = [(b'salt1', b'secret 1'), (b'salt2', b'secret 2')]
+        encrypted = self.enc2.encrypt_many(items)
+        self.assertEqual(len(encrypted), 2)
+
+        # Each secret can be decrypted individually with its salt
+        self.enc2.set_salt(b'salt2')
+        self.assertEqual(self.enc2.decrypt(encrypted[1]), b'secret 2')
+
+    def test_encrypt_many_2(self):
+        self.assertEqual(self.enc2.encrypt_many([]), [])
+
+    def test_decrypt_many(self):
+        items = [(b'salt1', b'secret 1'), (b'salt2', b''), (None, b'secret 3')]
+        encrypted = self.enc2.encrypt_many(items)
+        self.assertEqual(self.enc2.decrypt_many(
+            zip([b'salt1', b'salt2', None], encrypted)), [b'secret 1', b'', b'secret 3'])
+
+    def test_decrypt_many_2(self):
+        # Decrypting with the wrong salt
+        encrypted = self.enc2.encrypt_many([(b'salt1', b'secret 1')])
+        self.assertRaises(ValueError, self.enc2.decrypt_many,
+                          [(b'salt2', encrypted[0])])
+
+    def test_encrypt_with_salt(self):
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        self.assertIsInstance(encrypted, bytes)
+        self.assertIsNone(self.enc2.salted_key)
+
+    def test_decrypt_with_salt(self):
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        self.assertEqual(self.enc2.decrypt_with_salt(
+            b'salt1', encrypted), b'my secret string')
+        self.assertRaises(ValueError, self.enc2.decrypt_with_salt,
+                          b'salt2', encrypted)
+
+    def test_decrypt_count(self):
+        encrypted = self.enc2.encrypt_many([(b'salt1', b'a'), (b'salt2', b'b')])
+        count = self.enc2.decrypt_count
+        self.enc2.decrypt_with_salt(b'salt1', encrypted[0])
+        self.enc2.decrypt_many([(b'salt1', encrypted[0]), (b'salt2', encrypted[1])])
+        self.assertEqual(self.enc2.decrypt_count, count + 3)
+
+    def test_decrypt_with_salt_2(self):
+        # Decrypt from multiple threads sharing the same instance
+        salts = [self.enc2.gen_salt(False) for i in range(200)]
+        secrets = [('secret %d' % (i)).encode() for i in range(200)]
+        encrypted = [self.enc2.encrypt_with_salt(salt, secret)
+                     for salt, secret in zip(salts, secrets)]
+        self.enc2.clear_cache()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            decrypted = list(executor.map(
+                self.enc2.decrypt_with_salt, salts, encrypted))
+
+        self.assertEqual(decrypted, secrets)
+
+    def test_encrypt_version(self):
+        # Legacy CBC format
+        enc = Encryption(self.key, version=1)
+        encrypted = enc.encrypt_with_salt(b'salt1', b'my secret string')
+        self.assertFalse(encrypted.startswith(Encryption.gcm_prefix))
+        self.assertEqual(len(base64.b64decode(encrypted)), 48)
+
+    def test_encrypt_version_2(self):
+        # AES-GCM format
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        self.assertTrue(encrypted.startswith(Encryption.gcm_prefix))
+
+    def test_encrypt_version_3(self):
+        enc = Encryption(self.key, version=1234)
+        self.assertRaises(ValueError, enc.encrypt, b'my secret string')
+
+    def test_decrypt_version(self):
+        # Legacy CBC fields can be decrypted by an instance using the latest format
+        enc = Encryption(self.key, version=1)
+        encrypted = enc.encrypt_many([(b'salt1', b'secret 1')])
+        self.assertEqual(self.enc2.decrypt_many(
+            [(b'salt1', encrypted[0])]), [b'secret 1'])
+
+    def test_gcm_decrypt(self):
+        # Altered data is rejected
+        key = self.enc2.derive_key(b'salt1')
+        data = bytearray(self.enc2.gcm_encrypt(
+            key, self.enc2.gen_nonce(), b'my secret string'))
+        data[-1] ^= 1
+        self.assertRaises(ValueError, self.enc2.gcm_decrypt, key, data)
+
+    def test_encrypt_raw(self):
+        encrypted = self.enc2.encrypt_with_salt(
+            b'salt1', b'my secret string', raw=True)
+        self.assertEqual(encrypted[0], 2)
+        self.assertEqual(len(encrypted), 1 + 12 + 16 + 16)
+        self.assertEqual(self.enc2.decrypt_with_salt(
+            b'salt1', encrypted), b'my secret string')
+
+    def test_encrypt_raw_2(self):
+        enc = Encryption(self.key, version=1)
+        encrypted = enc.encrypt_many([(b'salt1', b'secret 1')], raw=True)
+        self.assertEqual(encrypted[0][0], 1)
+        self.assertEqual(self.enc2.decrypt_many(
+            [(b'salt1', encrypted[0])]), [b'secret 1'])
+
+    def test_unpack(self):
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        version, data = self.enc2.unpack(encrypted)
+        self.assertEqual(version, 2)
+        self.assertEqual(len(data), 12 + 16 + 16)
+
+    def test_to_raw(self):
+        for version in [1, 2]:
+            enc = Encryption(self.key, version=version)
+            encrypted = enc.encrypt_with_salt(b'salt1', b'my secret string')
+            raw = enc.to_raw(encrypted)
+            self.assertEqual(raw[0], version)
+            self.assertEqual(enc.to_raw(raw), raw)
+            self.assertEqual(enc.decrypt_with_salt(
+                b'salt1', raw), b'my secret string')
+
+    def test_data_key(self):
+        # Salted fields are encrypted with the data key
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        self.enc2.data_key = self.enc2.gen_data_key()
+        self.assertRaises(ValueError, self.enc2.decrypt_with_salt,
+                          b'salt1', encrypted)
+
+        encrypted = self.enc2.encrypt_with_salt(b'salt1', b'my secret string')
+        enc = Encryption(b'some other key')
+        enc.data_key = self.enc2.data_key
+        self.assertEqual(enc.decrypt_with_salt(
+            b'salt1', encrypted), b'my secret string')
+
+    def test_data_key_2(self):
+        # Unsalted values still use the key
+        encrypted = self.enc2.encrypt(b'my secret string')
+        self.enc2.data_key = self.enc2.gen_data_key()
+        self.assertEqual(self.enc2.decrypt(encrypted), b'my secret string')
+
+    def test_data_key_3(self):
+        # The previous data key is wiped
+        self.enc2.data_key = self.enc2.gen_data_key()
+        data_key = self.enc2.data_key
+        self.enc2.data_key = None
+        self.assertIsNone(self.enc2.data_key)
+        self.assertEqual(data_key, bytearray(32))
+
+    def test_gen_data_key(self):
+        data_key = self.enc2.gen_data_key()
+        self.assertIsInstance(data_key, bytes)
+        self.assertEqual(len(data_key), 32)
+
+    def test_wrap(self):
+        data_key = self.enc2.gen_data_key()
+        wrapped = self.enc2.wrap(data_key)
+        self.assertNotIn(data_key, base64.b64decode(wrapped[3:]))
+        self.assertEqual(self.enc2.unwrap(wrapped), data_key)
+
+    def test_unwrap(self):
+        # Unwrap with the wrong key
+        wrapped = self.enc2.wrap(self.enc2.gen_data_key())
+        self.assertRaises(ValueError, Encryption(
+            b'some other key').unwrap, wrapped)
@@ -0,0 +1,77 @@
+from ..base import BaseTest
+from ...lib.FuzzySearch import FuzzySearch
+
+
+class Test(BaseTest):
+
+    def setUp(self):
+        self.fields = {
+            1: ('Paypal', 'https://www.paypal.com', 'gab@gmail.com'),
+            2: ('Gmail', 'https://www.gmail.com', 'gab@gmail.com'),
+            3: ('Pay stub', 'https://payroll.example.com', 'john'),
+            4: ('Bank', 'https://www.bank.com', 'paypal@example.com'),
+        }
+
+        self.fuzzy = FuzzySearch()
+        for id_, fields in self.fields.items():
+            self.fuzzy.add(id_, fields)
+
+    def search(self, query, limit=10):
+        return self.fuzzy.search(query, self.fields.get, limit)
+
+    def test_get_tokens(self):
+        self.assertEqual(self.fuzzy.get_tokens('https://www.PayPal.com'),
+                         ['https', 'www', 'paypal', 'com'])
+        self.assertEqual(self.fuzzy.get_tokens(None), [])
+
+    def test_get_grams(self):
+        self.assertEqual(self.fuzzy.get_grams(['pay']), {' pa', 'pay', 'ay '})
+        self.assertEqual(self.fuzzy.get_grams(['a']), {' a '})
+
+    def test_edit_distance(self):
+        self.assertEqual(self.fuzzy.edit_distance('paypal', 'paypal', 2), 0)
+        self.assertEqual(self.fuzzy.edit_distance('paypl', 'paypal', 2), 1)
+        self.assertEqual(self.fuzzy.edit_distance('pyapal', 'paypal', 2), 1)  # Transposition
+        self.assertEqual(self.fuzzy.edit_distance('kitten', 'sitting', 5), 3)
+
+    def test_edit_distance_2(self):
+        # Distances above the maximum are capped
+        self.assertEqual(self.fuzzy.edit_distance('paypal', 'gmail', 1), 2)
+        self.assertEqual(self.fuzzy.edit_distance('a', 'abcdef', 2), 3)
+
+    def test_get_similarity(self):
+        self.assertGreater(self.fuzzy.get_similarity('paypal', 'paypal'),
+                           self.fuzzy.get_similarity('paypl', 'paypal'))
+        self.assertGreater(self.fuzzy.get_similarity('pay', 'pay'),
+                           self.fuzzy.get_similarity('pay', 'paypal'))
+        self.assertEqual(self.fuzzy.get_similarity('paypal', 'gmail'), 0)
+
+    def test_get_candidates(self):
+        self.assertEqual(sorted(self.fuzzy.get_candidates(['paypl'])), [1, 3, 4])
+        self.assertEqual(self.fuzzy.get_candidates(['amazon']), [])
+
+    def test_search(self):
+        # One typo
+        self.assertEqual(self.search('paypl'), [1, 4])
+        self.assertEqual(self.search('gmial'), [2, 1])
+
+    def test_search_2(self):
+        # Names rank above logins and URLs, exact words above prefixes
+        self.assertEqual(self.search('paypal'), [1, 4])
+        self.assertEqual(self.search('pay'), [3, 1, 4])
+
+    def test_search_3(self):
+        # Every word of the query must match
+        self.assertEqual(self.search('pay stbu'), [3])
+        self.assertEqual(self.search('pay amazon'), [])
+
+    def test_search_4(self):
+        # The best `limit` results are kept
+        self.assertEqual(self.search('pay', limit=2), [3, 1])
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.search('zzzz'), [])
+
+    def test_delete(self):
+        self.assertTrue(self.fuzzy.delete(1, self.fields[1]))
+        self.assertEqual(self.search('paypal'), [4])
+        self.assertNotIn(' gm', [gram for gram, ids in self.fuzzy.grams.items() if 1 in ids])
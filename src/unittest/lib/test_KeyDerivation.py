@@ -0,0 +1,41 @@
+from hashlib import sha256
+from unittest.mock import patch
+
+from ..base import BaseTest
+from ...lib.KeyDerivation import KeyDerivation
+
+
+class Test(BaseTest):
+
+    def setUp(self):
+        self.kdf = KeyDerivation(1000)
+
+    def test_derive(self):
+        key = self.kdf.derive(b'key', b'salt')
+        self.assertIsInstance(key, bytes)
+        self.assertEqual(len(key), 32)
+        self.assertEqual(key, KeyDerivation(1000).derive(b'key', b'salt'))
+
+    def test_derive_2(self):
+        # Different parameters give a different key
+        self.assertNotEqual(self.kdf.derive(b'key', b'salt'),
+                            KeyDerivation(1001).derive(b'key', b'salt'))
+
+    def test_derive_3(self):
+        # Legacy vaults use a single SHA-256
+        self.assertEqual(KeyDerivation().derive(b'key', b'salt'),
+                         sha256(b'keysalt').digest())
+
+    def test_measure(self):
+        self.assertIsInstance(self.kdf.measure(1000), float)
+
+    def test_calibrate(self):
+        # 20,000 iterations take 20 ms: 250,000 are needed for 250 ms
+        with patch.object(KeyDerivation, 'measure', return_value=0.02):
+            self.assertEqual(self.kdf.calibrate(250), 250000)
+
+    def test_calibrate_2(self):
+        # Never go below the minimum
+        with patch.object(KeyDerivation, 'measure', return_value=10):
+            self.assertEqual(self.kdf.calibrate(250),
+                             KeyDerivation.min_iterations)
@@ -0,0 +1,35 @@
+from ..base import BaseTest
+from ...lib.SearchQuery import SearchQuery
+
+
+class Test(BaseTest):
+
+    def test_parse(self):
+        self.assertEqual(SearchQuery('login:alice cat:infra url:*.corp.example name:^db').terms, [
+            ('login', 'contains', 'alice'),
+            ('category', 'contains', 'infra'),
+            ('url', 'pattern', '*.corp.example'),
+            ('name', 'prefix', 'db'),
+        ])
+
+    def test_parse_2(self):
+        # Quoted values, exact values and unqualified terms
+        self.assertEqual(SearchQuery('Category:"=My category" bank').terms, [
+            ('category', 'equals', 'My category'),
+            (None, 'contains', 'bank'),
+        ])
+
+    def test_parse_3(self):
+        # Unknown prefixes are part of the value
+        self.assertEqual(SearchQuery('https://www.example.com').terms,
+                         [(None, 'contains', 'https://www.example.com')])
+
+    def test_parse_4(self):
+        # Empty values are ignored
+        self.assertEqual(SearchQuery('login:^ url:* ""').terms, [])
+
+    def test_is_qualified(self):
+        self.assertTrue(SearchQuery('login:alice').is_qualified())
+        self.assertTrue(SearchQuery('^pay').is_qualified())
+        self.assertFalse(SearchQuery('some name').is_qualified())
+        self.assertFalse(SearchQuery('https://www.example.com').is_qualified())
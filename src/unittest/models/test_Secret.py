@@ -1,8 +1,14 @@
 from unittest.mock import patch
 import uuid
 
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
 from ..base import BaseTest
+from ...models import Secret
+from ...models.base import Base
 from ...models.Secret import SecretModel
+from ...models.Category import CategoryModel
 from ...lib.Encryption import Encryption
 from ...modules.carry import global_scope
 
@@ -37,6 +43,59 @@ class Test(BaseTest):
         print(secret)  # Required for codecov
         self.assertIsInstance(secret, object)
 
+    def test_category_name(self):
+        category = CategoryModel(name='Some category')
+        self.session.add(category)
+        self.session.commit()
+
+        secret = self.session.query(SecretModel).get(1)
+        self.assertEqual(secret.category_name, '')
+
+        secret.category_id = category.id
+        self.session.commit()
+        self.assertEqual(secret.category_name, 'Some category')
+
+        # Deleted categories are not shown
+        category.active = 0
+        self.session.commit()
+        self.assertEqual(secret.category_name, '')
+
+    def test_get_decrypted(self):
+        # Fields are decrypted once
+        secret = self.session.query(SecretModel).get(1)
+        count = global_scope['enc'].decrypt_count
+        for i in range(3):
+            self.assertEqual(secret.password, self.password)
+            self.assertEqual(secret.notes, self.notes)
+        self.assertEqual(global_scope['enc'].decrypt_count, count + 2)
+        self.assertIn(secret, SecretModel.decrypted)
+
+    def test_get_decrypted_2(self):
+        # Setters, commits and locking the vault forget decrypted fields
+        secret = SecretModel(name='Other name', password=self.password, notes=self.notes)
+        self.session.add(secret)
+        self.session.commit()
+        self.assertEqual(secret.password, self.password)
+
+        secret.password = 'new password'
+        self.assertEqual(secret.password, 'new password')
+        self.assertEqual(secret.notes, self.notes)
+
+        self.session.commit()
+        self.assertNotIn('_decrypted', secret.__dict__)
+        self.assertEqual(secret.password, 'new password')
+
+        SecretModel.forget_all_decrypted()
+        self.assertNotIn('_decrypted', secret.__dict__)
+        self.assertNotIn(secret, SecretModel.decrypted)
+
+    def test_get_decrypted_3(self):
+        # Encrypting in batch forgets decrypted fields
+        secret = SecretModel(name='Other name', password=self.password, notes=self.notes)
+        self.assertEqual(secret.notes, self.notes)
+        SecretModel.encrypt_many([secret], [('password', 'new notes')])
+        self.assertEqual(secret.notes, 'new notes')
+
     def test_get_enc(self):
         secret = self.session.query(
             SecretModel).filter_by(name=self.name).first()
@@ -62,3 +121,42 @@ class Test(BaseTest):
         secret = self.session.query(
             SecretModel).filter_by(name=self.name).first()
         self.assertEqual(secret.notes, self.notes)
+
+    def test_decrypt_many(self):
+        secrets = self.session.query(SecretModel).all()
+        values = SecretModel.decrypt_many(secrets)
+        self.assertEqual(len(values), len(secrets))
+        self.assertEqual(values[0], (self.password, self.notes))
+
+    def test_encrypt_many(self):
+        secret = SecretModel(name='Some name', password=None, notes=None)
+        SecretModel.encrypt_many([secret], [('new password', 'new notes')])
+        self.assertEqual(secret.password, 'new password')
+        self.assertEqual(secret.notes, 'new notes')
+
+    def test_encrypt_many_2(self):
+        # Encrypt with another key
+        enc = Encryption(b'some other key')
+        secret = SecretModel(name='Some name')
+        SecretModel.encrypt_many([secret], [('new password', '')], enc)
+        self.assertEqual(SecretModel.decrypt_many(
+            [secret], enc), [('new password', '')])
+
+    def test_supports_search_index(self):
+        # SQLite libraries without trigrams (before 3.34) cannot create the full-text search index
+        engine = create_engine('sqlite://')
+        with patch.object(Secret, 'trigram_support', None), \
+                patch.object(engine, 'execute', side_effect=OperationalError('', {}, Exception('no such tokenizer: trigram'))):
+            self.assertFalse(Secret.supports_search_index(engine))
+            self.assertFalse(Secret.supports_search_index(engine))
+            engine.execute.assert_called_once()
+
+    def test_supports_search_index_2(self):
+        # New vaults are created without the index and its triggers
+        engine = create_engine('sqlite://')
+        with patch.object(Secret, 'trigram_support', False):
+            Base.metadata.create_all(engine)
+
+        names = [row[0] for row in engine.execute('SELECT name FROM sqlite_master')]
+        self.assertIn('secrets', names)
+        self.assertFalse([name for name in names if name.startswith('secrets_fts')])
@@ -0,0 +1,28 @@
+from ..base import BaseTest
+from ...models.Secret import SecretModel
+from ...models.SecretPayload import SecretPayloadModel
+
+
+class Test(BaseTest):
+
+    def setUp(self):
+        # Create a secret, its payload is saved with it
+        secret = SecretModel(name='Vault', password='some_password', notes='some notes')
+        self.session.add(secret)
+        self.session.commit()
+
+    def test_get_by_id(self):
+        payload = self.session.query(SecretPayloadModel).get(1)
+        self.assertIsInstance(payload._password, bytes)
+        self.assertIsInstance(payload._notes, bytes)
+        self.assertEqual(payload._salt, self.session.query(SecretModel).get(1).salt)
+
+    def test_delete(self):
+        self.session.delete(self.session.query(SecretModel).get(1))
+        self.session.commit()
+        self.assertIsNone(self.session.query(SecretPayloadModel).get(1))
+
+    def test_repr(self):
+        payload = self.session.query(SecretPayloadModel).get(1)
+        print(payload)  # Required for codecov
+        self.assertIsInstance(payload, object)
@@ -1,5 +1,6 @@
 from unittest.mock import patch
 import tempfile
+from hashlib import sha256
 
 from sqlalchemy import engine
 from sqlalchemy.orm import Session
@@ -22,10 +23,36 @@ class Test(BaseTest):
     def test_drop_sessions(self):
         self.assertTrue(base.drop_sessions())
         self.assertEqual(base.sessions, {})
+        self.assertEqual(base.engines, {})
+
+    def test_drop_sessions_2(self):
+        # Engines are disposed
+        engine_ = base.get_session().get_bind()
+        with patch.object(engine_, 'dispose') as patched:
+            base.drop_sessions()
+        patched.assert_called_once_with()
 
     def test_get_engine(self):
         self.assertIsInstance(base.get_engine(), engine.base.Engine)
 
+    def test_get_engine_reused(self):
+        # The same engine is returned for a vault until sessions are dropped
+        self.assertIs(base.get_engine(), base.get_engine())
+        self.assertIs(base.get_session().get_bind(), base.get_engine())
+
+    def test_get_engine_connections(self):
+        # A connection is opened once and reused
+        base.drop_sessions()
+        opened = base.connections_opened
+        for i in range(3):
+            base.get_session().execute('SELECT 1')
+        self.assertEqual(base.connections_opened, opened + 1)
+
+        # Dropping sessions forces a new connection
+        base.drop_sessions()
+        base.get_session().execute('SELECT 1')
+        self.assertEqual(base.connections_opened, opened + 2)
+
     def test_get_engine_2(self):
         # Text exception with `db_file` is not defined
         with patch.dict(global_scope, {'db_file': None}):
@@ -50,6 +77,52 @@ class Test(BaseTest):
         with patch.dict(global_scope, {'conf': None}):
             self.assertRaises(RuntimeError, base.get_db_key)
 
+    def test_get_db_key_4(self):
+        # Legacy vaults: single SHA-256 of the key and salt
+        key_salt = self.secret_key.encode() + self.config.salt.encode()
+        self.assertEqual(base.get_db_key(0), sha256(key_salt).hexdigest())
+
+    def test_get_db_key_5(self):
+        # Key derived with the parameters saved in the config file
+        self.config.update('kdfIterations', 1000, quiet=True)
+        key = base.get_db_key()
+        self.config.update('kdfIterations', 0, quiet=True)
+
+        self.assertEqual(key, base.get_db_key(1000))
+        self.assertNotEqual(key, base.get_db_key())
+
+    def test_get_engine_4(self):
+        # Page cache size is applied to new connections
+        self.config.update('cacheSize', 1234, quiet=True)
+        base.drop_sessions()
+        cache_size = base.get_engine().execute('PRAGMA cache_size').scalar()
+        self.config.update('cacheSize', 0, quiet=True)
+        base.drop_sessions()
+
+        self.assertEqual(cache_size, 1234)
+
+    def test_get_db_passphrase(self):
+        self.assertEqual(base.get_db_passphrase(raw_key=False),
+                         base.get_db_key())
+
+    def test_get_db_passphrase_2(self):
+        # Raw key mode
+        self.assertEqual(base.get_db_passphrase(raw_key=True),
+                         "x'%s'" % (base.get_db_key()))
+
+    def test_get_cipher_settings(self):
+        self.assertEqual(base.get_cipher_settings(), {})
+
+    def test_get_cipher_settings_2(self):
+        self.config.update('cipherKdfIter', 64000, quiet=True)
+        self.config.update('cipherPageSize', 8192, quiet=True)
+        settings = base.get_cipher_settings()
+        self.config.update('cipherKdfIter', 0, quiet=True)
+        self.config.update('cipherPageSize', 0, quiet=True)
+
+        self.assertEqual(
+            settings, {'kdf_iter': 64000, 'cipher_page_size': 8192})
+
     def test_get_slashes(self):
         with patch.dict(global_scope, {'db_file': '/foo/bar'}):
             self.assertEqual(base.get_slashes(encrypted=True), '//')
@@ -49,3 +49,32 @@ class Test(BaseTest):
 
         with patch('builtins.input', return_value='some_value'):
             assert autocomplete.get_input_autocomplete() == 'some_value'
+
+    def test_autocomplete_4(self):
+        # Multi-word suggestions are completed from the last word
+        autocomplete.set_parameters(list_=['My Bank', 'My Mail', 'Bank'], case_sensitive=False)
+
+        with patch('readline.get_line_buffer', return_value='my m'):
+            assert autocomplete.autocomplete('m', state=0) == 'mail'
+            assert autocomplete.autocomplete('m', state=1) is None
+
+    def test_autocomplete_5(self):
+        # Results are computed once per buffer, and again once the parameters change
+        autocomplete.set_parameters(['one_thing', 'one_other_thing', 'third_thing'])
+
+        with patch('readline.get_line_buffer', return_value='one'), \
+                patch.object(autocomplete, 'get_results', wraps=autocomplete.get_results) as patched:
+            for state in range(3):
+                autocomplete.autocomplete('on', state=state)
+            patched.assert_called_once_with('one')
+
+            autocomplete.set_parameters(['one'])
+            assert autocomplete.autocomplete('on', state=0) == 'one'
+            assert patched.call_count == 2
+
+    def test_get_results(self):
+        autocomplete.set_parameters(['b', 'ab', 'a', 'abc', 'a'])
+
+        assert autocomplete.get_results('a') == ['ab', 'a', 'abc', 'a', None]
+        assert autocomplete.get_results('') == ['b', 'ab', 'a', 'abc', 'a', None]
+        assert autocomplete.get_results('c') == [None]
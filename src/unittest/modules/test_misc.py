@@ -70,6 +70,14 @@ class Test(BaseTest):
             self.assertRaises(SystemExit, misc.erase_vault,
                               file_a.name + '/non/existent', file_b.name + '/non/existent')
 
+    def test_erase_vault_3(self):
+        # Connections to the vault are closed before erasing it
+        with patch('src.modules.misc.confirm', return_value=True), \
+                patch('src.models.base.drop_sessions') as patched:
+            self.assertRaises(SystemExit, misc.erase_vault,
+                              '/non/existent', '/non/existent')
+        patched.assert_called_once_with()
+
     def test_confirm(self):
         with patch('builtins.input', return_value='y'):
             self.assertTrue(misc.confirm())
@@ -49,6 +49,10 @@ class Test(BaseTest):
     def test_config_update_3(self):
         self.assertTrue(vault.config_update(hide_secret_TTL='5'))
 
+    def test_config_update_4(self):
+        self.assertTrue(vault.config_update(cache_size='-2000'))
+        global_scope['conf'].update('cacheSize', 0, quiet=True)
+
     @patch.object(menu, 'menu')
     def test_initialize(self, patched):
         # Test unlock
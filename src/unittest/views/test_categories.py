@@ -3,7 +3,9 @@ from unittest.mock import patch
 from ..base import BaseTest
 from ...models.Category import CategoryModel
 from ...models.Secret import SecretModel
+from ...views.secrets import build_catalog
 from ...views import categories
+from ...modules.carry import global_scope
 
 
 class Test(BaseTest):
@@ -22,6 +24,7 @@ class Test(BaseTest):
 
     def tearDown(self):
         self.session.query(CategoryModel).delete()
+        self.session.query(SecretModel).delete()
         self.session.commit()
 
     def test_all(self):
@@ -29,6 +32,16 @@ class Test(BaseTest):
         self.assertIsInstance(cats, list)
         self.assertEqual(len(cats), 3)
 
+    def test_all_2(self):
+        # Categories are read-only records with or without the cache, not models that could be added to a session
+        with patch.dict(global_scope, {'categories': None}):
+            for i in range(2):
+                cats = categories.all()
+                self.assertEqual(cats[0], categories.CategoryRow(1, 'My category 1'))
+                self.assertNotIsInstance(cats[0], CategoryModel)
+
+                categories.build_cache()
+
     def test_to_table(self):
         self.assertIsInstance(categories.to_table(categories.all()), str)
 
@@ -87,6 +100,74 @@ class Test(BaseTest):
     def test_get_id_3(self):
         self.assertIsNone(categories.get_id(None))
 
+    def test_get_id_plan(self):
+        plans = self.query_plans(categories.get_id, 'My category 1')
+        self.assertIn('USING INDEX ix_categories_name', plans[0])
+
+    def test_build_cache(self):
+        with patch.dict(global_scope, {'categories': None}):
+            cache = categories.build_cache()
+            self.assertIs(global_scope['categories'], cache)
+            self.assertEqual(list(cache.values()), ['My category 1', 'My category 2', 'My category 3'])
+
+    def test_cache(self):
+        # Once the cache is built, categories are read without any query
+        with patch.dict(global_scope, {'categories': None}):
+            categories.build_cache()
+
+            def read():
+                self.assertEqual([cat.name for cat in categories.all()],
+                                 ['My category 1', 'My category 2', 'My category 3'])
+                self.assertEqual(categories.get_name('1'), 'My category 1')
+                self.assertEqual(categories.get_name(4), '')
+                self.assertEqual(categories.get_id('My category 2'), 2)
+                self.assertIsNone(categories.get_id('My disabled category'))
+                self.assertTrue(categories.exists('3'))
+                self.assertFalse(categories.exists(4))
+                self.assertEqual(categories.get_names()[1], 'My category 1')
+
+            self.assertEqual(self.get_statements(read), [])
+
+    def test_cache_2(self):
+        # The cache is updated when categories are added, renamed or deleted
+        with patch.dict(global_scope, {'categories': None}):
+            categories.build_cache()
+
+            categories.add('My new category')
+            id_ = categories.get_id('My new category')
+            self.assertEqual(id_, 5)
+
+            categories.rename(id_, 'Some new name')
+            self.assertEqual(categories.get_name(id_), 'Some new name')
+            self.assertIsNone(categories.get_id('My new category'))
+
+            categories.delete(id_)
+            self.assertFalse(categories.exists(id_))
+
+            self.assertEqual(global_scope['categories'], categories.load_names())
+            self.assertEqual(global_scope['category_ids'], categories.index_names(categories.load_names()))
+
+    def test_cache_3(self):
+        # Categories IDs are kept by name, the lowest ID is returned for duplicate names
+        with patch.dict(global_scope, {'categories': None, 'category_ids': None}):
+            categories.build_cache()
+
+            categories.add('My category 2')
+            self.assertEqual(categories.get_id('My category 2'), 2)
+
+            categories.rename(2, 'Some new name')
+            self.assertEqual(categories.get_id('My category 2'), 5)
+            self.assertEqual(categories.get_id('Some new name'), 2)
+
+            categories.add('Some new name')
+            categories.delete(2)
+            self.assertEqual(categories.get_id('Some new name'), 6)
+
+            categories.delete(5)
+            self.assertIsNone(categories.get_id('My category 2'))
+
+            self.assertEqual(global_scope['category_ids'], categories.index_names(categories.load_names()))
+
     def test_add(self):
         self.assertTrue(categories.add('My new category'))
 
@@ -205,6 +286,36 @@ class Test(BaseTest):
 
         self.assertFalse(categories.delete_input())
 
+    def test_get_counts(self):
+        secrets = [SecretModel(name='Name', category_id=1),
+                   SecretModel(name='Name', category_id=1),
+                   SecretModel(name='Name', category_id=2)]
+        self.session.add_all(secrets)
+        self.session.commit()
+
+        self.assertEqual(categories.get_counts(), {1: 2, 2: 1})
+        self.assertIn('USING COVERING INDEX ix_secrets_category_id',
+                      self.query_plans(categories.get_counts)[0])
+
+        # Counts are kept by the catalog when the vault is unlocked
+        with patch.dict(global_scope, {'catalog': None}):
+            build_catalog()
+            self.assertEqual(self.get_statements(categories.get_counts), [])
+            self.assertEqual(categories.get_counts(), {1: 2, 2: 1})
+            self.assertTrue(categories.is_used(2))
+            self.assertFalse(categories.is_used(3))
+
+    def test_to_table_3(self):
+        # The number of secrets of each category is shown
+        self.session.add(SecretModel(name='Name', category_id=1))
+        self.session.commit()
+
+        self.assertRegex(categories.to_table(categories.all()), r'My category 1\s+1\n')
+
+    def test_is_used_plan(self):
+        plans = self.query_plans(categories.is_used, 1)
+        self.assertIn('USING INDEX ix_secrets_category_id', plans[0])
+
     def test_is_used(self):
         # Create a secret
         secret = SecretModel(name='Name', url='-', login='login',
@@ -1,12 +1,19 @@
 from unittest.mock import patch
+import hashlib
+import os
+import tempfile
+
+import sqlcipher3
 
 from sqlalchemy import engine
 from sqlalchemy.orm import Session
 
 from ..base import BaseTest
-from ...views import change_key
+from ...views import change_key, users
+from ...models.base import Base, get_session, get_engine, get_db_passphrase, drop_sessions
 from ...modules.carry import global_scope
 from ...lib.Encryption import Encryption
+from ...lib.KeyDerivation import KeyDerivation
 from ...models.Secret import SecretModel
 from ...models.User import UserModel
 
@@ -14,6 +21,9 @@ from ...models.User import UserModel
 class Test(BaseTest):
 
     def setUp(self):
+        # Preserve enc to restore it on tear down
+        self.enc_save = global_scope['enc']
+
         # Set instances of Encryption for the current and the new key
         change_key.enc_current = global_scope['enc']
         # Forcing same key to not invalidate the db for further tests
@@ -51,8 +61,12 @@ class Test(BaseTest):
         self.session.commit()
 
     def tearDown(self):
-        # Truncate users table
+        # restore enc in global scope
+        global_scope['enc'] = self.enc_save
+
+        # Truncate users and secrets tables (secrets depend on the data key)
         self.session.query(UserModel).delete()
+        self.session.query(SecretModel).delete()
         self.session.commit()
 
     def test_rekey(self):
@@ -69,11 +83,135 @@ class Test(BaseTest):
     def test_rekey_secrets(self):
         self.assertTrue(change_key.rekey_secrets())
 
+    def test_rekey_3(self):
+        # The data key is encrypted with the new key, secrets are untouched
+        with patch('getpass.getpass', return_value=self.secret_key):
+            self.assertTrue(change_key.unlock())
+        before = [row._password for row in self.session.query(SecretModel)]
+
+        with patch('getpass.getpass', return_value=self.secret_key):
+            self.assertTrue(change_key.rekey())
+
+        self.session.expire_all()
+        self.assertEqual(
+            [row._password for row in self.session.query(SecretModel)], before)
+
+    def test_rekey_data_key(self):
+        global_scope['enc'] = Encryption(self.secret_key.encode())
+        users.data_key_new()
+        self.assertTrue(change_key.rekey_data_key())
+        self.assertEqual(change_key.enc_new.data_key,
+                         global_scope['enc'].data_key)
+
+    def test_rekey_data_key_2(self):
+        # Test without a data key
+        self.assertFalse(change_key.rekey_data_key())
+
     def test_rekey_validation_key(self):
         self.assertTrue(change_key.rekey_validation_key())
 
-    # def test_rekey_db(self):
-    #     self.assertTrue(change_key.rekey_db())
+    def test_rekey_db(self):
+        self.assertTrue(change_key.rekey_db())
+        self.assertIs(global_scope['enc'], change_key.enc_new)
+
+        # The database can be opened with the new key
+        self.assertEqual(get_session().query(SecretModel).count(), 3)
+
+    def test_calibrate(self):
+        with patch('getpass.getpass', return_value=self.secret_key), \
+                patch.object(KeyDerivation, 'calibrate', return_value=1000):
+            self.assertTrue(change_key.calibrate(250))
+        self.assertEqual(self.config.kdfIterations, 1000)
+
+        # The vault uses a raw key, SQLCipher does not add its own key derivation
+        self.assertTrue(self.config.rawKey)
+
+        # The database can be opened with the key derived with the new parameters
+        self.assertEqual(get_session().query(SecretModel).count(), 3)
+
+        # Restore the legacy key for further tests
+        change_key.export_db(raw_key=False, iterations=0)
+        self.assertEqual(get_session().query(SecretModel).count(), 3)
+
+    def test_calibrate_2(self):
+        # The vault is left untouched when the parameters cannot be saved
+        with patch('getpass.getpass', return_value=self.secret_key), \
+                patch.object(KeyDerivation, 'calibrate', return_value=1000), \
+                patch.object(self.config, 'save_config', side_effect=OSError()):
+            self.assertRaises(OSError, change_key.calibrate, 250)
+        self.assertFalse(self.config.kdfIterations)
+        self.assertFalse(self.config.rawKey)
+        self.assertFalse(os.path.isfile(global_scope['db_file'] + '.converted'))
+
+        # The database still opens with the saved parameters
+        drop_sessions()
+        self.assertEqual(get_session().query(SecretModel).count(), 3)
+
+    def test_convert_db(self):
+        # Use a separate vault, the file is replaced during the conversion
+        file_ = tempfile.NamedTemporaryFile(delete=False)
+        with patch.dict(global_scope, {'db_file': file_.name}):
+            drop_sessions()
+            Base.metadata.create_all(get_engine())
+            users.validation_key_new()
+
+            # Vaults without key stretching are calibrated first
+            with patch('getpass.getpass', return_value=self.secret_key), \
+                    patch.object(KeyDerivation, 'calibrate', return_value=1000):
+                self.assertTrue(change_key.convert_db(
+                    raw_key=True, page_size=8192))
+            self.assertTrue(self.config.rawKey)
+            self.assertEqual(self.config.cipherPageSize, 8192)
+            self.assertEqual(self.config.kdfIterations, 1000)
+
+            # The converted vault can be opened with a raw key
+            self.assertEqual(get_session().query(UserModel).filter_by(key='key_validation').count(), 1)
+            self.assertEqual(get_session().execute(
+                'PRAGMA cipher_page_size').scalar(), '8192')
+
+            # Convert it back to the default settings
+            with patch('getpass.getpass', return_value=self.secret_key):
+                self.assertTrue(change_key.convert_db(raw_key=False))
+            self.assertFalse(self.config.rawKey)
+            self.assertEqual(get_session().query(UserModel).filter_by(key='key_validation').count(), 1)
+
+        drop_sessions()
+        os.remove(file_.name)
+        self.config.update('kdfIterations', 0, quiet=True)
+
+    def test_convert_db_2(self):
+        # Raw keys are never derived with the legacy single SHA-256
+        self.addCleanup(self.config.update, 'rawKey', False, quiet=True)
+        self.addCleanup(self.config.update, 'kdfIterations', 0, quiet=True)
+        file_ = tempfile.NamedTemporaryFile(delete=False)
+        with patch.dict(global_scope, {'db_file': file_.name}):
+            drop_sessions()
+            Base.metadata.create_all(get_engine())
+            users.validation_key_new()
+
+            self.assertRaises(ValueError, change_key.export_db, raw_key=True)
+            self.assertFalse(self.config.rawKey)
+
+            with patch('getpass.getpass', return_value=self.secret_key), \
+                    patch.object(KeyDerivation, 'calibrate', return_value=1000):
+                self.assertTrue(change_key.convert_db(raw_key=True))
+            drop_sessions()
+
+            def open_with(key):
+                connection = sqlcipher3.connect(file_.name)
+                try:
+                    connection.execute('PRAGMA key="%s"' % (key))
+                    return connection.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+                finally:
+                    connection.close()
+
+            salt = self.config.salt.encode()
+            legacy_key = hashlib.sha256(self.secret_key.encode() + salt).hexdigest()
+            self.assertRaises(sqlcipher3.DatabaseError, open_with, "x'%s'" % (legacy_key))
+            stretched_key = hashlib.pbkdf2_hmac('sha256', self.secret_key.encode(), salt, 1000).hex()
+            self.assertGreater(open_with("x'%s'" % (stretched_key)), 0)
+
+        os.remove(file_.name)
 
     def test_unlock(self):
         with patch('getpass.getpass', return_value=self.secret_key):
@@ -2,8 +2,10 @@ from unittest.mock import patch
 
 from ..base import BaseTest
 from ...models.Secret import SecretModel
-from ...views import menu
+from ...views import menu, upgrade
+from ...models import base
 from ...modules.carry import global_scope
+from ...lib.Encryption import Encryption
 
 
 class Test(BaseTest):
@@ -60,6 +62,40 @@ class Test(BaseTest):
         self.assertFalse(menu.validate_key(
             'some invalid key'))
 
+    def test_validate_key_3(self):
+        # Unlocking a vault keeps its encrypted fields format
+        global_scope['conf'].update('keyVersion', '1', quiet=True)
+        self.addCleanup(global_scope['conf'].update, 'keyVersion', Encryption.latest_version, quiet=True)
+        self.assertTrue(menu.validate_key(self.secret_key))
+        self.assertEqual(global_scope['enc'].version, 1)
+        self.assertEqual(global_scope['conf'].keyVersion, 1)
+
+    def test_validate_key_5(self):
+        # The catalog and the categories cache are built when the vault is unlocked
+        with patch.dict(global_scope, {'catalog': None, 'categories': None}):
+            self.assertTrue(menu.validate_key(self.secret_key))
+            self.assertIsNotNone(global_scope['catalog'])
+            self.assertIsNotNone(global_scope['categories'])
+
+    def test_validate_key_4(self):
+        # Unlock time is reported
+        with patch('builtins.print') as print_:
+            self.assertTrue(menu.validate_key(self.secret_key))
+        self.assertRegex(print_.call_args_list[0][0][0],
+                         r'^Vault unlocked in \d+ ms\.$')
+
+    def test_validate_key_6(self):
+        # A failing upgrade stops the unlock with a message
+        error = upgrade.UpgradeError(2, 'Some step', '/some/backup')
+        error.__cause__ = ValueError('some error')
+        with patch.object(upgrade, 'run', side_effect=error), \
+                patch('builtins.print') as print_:
+            self.assertRaises(SystemExit, menu.validate_key, self.secret_key)
+
+        output = '\n'.join(call[0][0] for call in print_.call_args_list if call[0])
+        self.assertIn('Upgrade 2 of %d (Some step) failed: some error' % (upgrade.get_latest_version()), output)
+        self.assertIn('/some/backup', output)
+
     def test_menu(self):
         with patch('builtins.input', return_value='q'):
             self.assertRaises(SystemExit, menu.menu)
@@ -70,8 +106,21 @@ class Test(BaseTest):
     @patch.object(menu, 'unlock')
     def test_lock(self, patched):
         patched.return_value = None
+        enc = global_scope['enc']
+        enc.derive_key(b'some salt')
         self.assertIsNone(menu.lock())
         self.assertIsNone(global_scope['enc'])
+        self.assertEqual(len(enc.key_cache), 0)
+
+        # Connections opened with the master key are closed
+        self.assertEqual(base.engines, {})
+
+        # Decrypted secrets are forgotten
+        self.assertEqual(len(SecretModel.decrypted), 0)
+
+        # The catalogs are dropped
+        self.assertIsNone(global_scope['catalog'])
+        self.assertIsNone(global_scope['categories'])
 
     def test_quit(self):
         self.assertRaises(SystemExit, menu.quit)
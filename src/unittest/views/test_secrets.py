@@ -3,8 +3,10 @@ from unittest.mock import patch
 import pyperclip
 
 from ..base import BaseTest
-from ...models.Secret import SecretModel
+from ...models.base import get_session
+from ...models.Secret import SecretModel, has_search_index, search_indexes
 from ...models.Category import CategoryModel
+from ...lib.Catalog import CatalogRow
 from ...views import secrets
 from ...modules.carry import global_scope
 
@@ -39,6 +41,9 @@ class Test(BaseTest):
 
         self.session.commit()
 
+        # Whether the vault has the full-text search index is read once, before the statements are checked
+        has_search_index()
+
     def tearDown(self):
         self.session.query(SecretModel).delete()
         self.session.commit()
@@ -48,17 +53,73 @@ class Test(BaseTest):
         self.assertIsInstance(all_secrets, list)
         self.assertEqual(len(all_secrets), 3)
 
+    def test_all_2(self):
+        # Encrypted fields are not loaded with the list
+        get_session().expunge_all()
+        statements = self.get_statements(secrets.all)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('secret_payloads', statements[0][0])
+
+        # They are loaded, in one query, when a secret is viewed
+        secret = secrets.all()[0]
+        statements = self.get_statements(lambda: (secret.notes, secret.password))
+        self.assertEqual(len(statements), 1)
+        self.assertIn('_password', statements[0][0])
+
+    def test_all_3(self):
+        # Encrypted fields loaded with the secrets
+        get_session().expunge_all()
+        statements = self.get_statements(
+            lambda: SecretModel.decrypt_many(secrets.all(encrypted=True)))
+        self.assertEqual(len(statements), 1)
+        self.assertIn('_notes', statements[0][0])
+
+    def test_search_4(self):
+        get_session().expunge_all()
+        for query in ['gmail', 'login:gab']:
+            statements = self.get_statements(secrets.search_dispatch, query)
+            self.assertNotIn('_notes', ' '.join(statement for statement, parameters in statements))
+
     def test_to_table(self):
         self.assertIsInstance(secrets.to_table(secrets.all()), str)
 
     def test_to_table_2(self):
         self.assertEqual(secrets.to_table([]), 'Empty!')
 
+    def test_to_table_3(self):
+        self.assertIn('My category 1', secrets.to_table(secrets.all()))
+        self.assertIn('My category 1', secrets.to_table(secrets.load_catalog().all()))
+
+    def test_to_table_queries(self):
+        # Categories are loaded with the secrets, whatever the number of secrets
+        self.assertEqual(len(self.get_statements(lambda: secrets.to_table(secrets.all()))), 1)
+
+        secrets.add_many([{'name': 'Secret %d' % (i), 'category_id': 1} for i in range(10)])
+        get_session().expunge_all()
+        self.assertEqual(len(self.get_statements(lambda: secrets.to_table(secrets.all()))), 1)
+
+        # Listed rows only have the category ID, names are loaded once
+        self.assertEqual(len(self.get_statements(lambda: secrets.to_table(secrets.search('secret')))), 2)
+        rows = secrets.load_catalog().all()
+        self.assertEqual(len(self.get_statements(secrets.to_table, rows)), 1)
+
     def test_count(self):
         count_secrets = secrets.count()
         self.assertIsInstance(count_secrets, int)
         self.assertEqual(count_secrets, 3)
 
+    def test_count_2(self):
+        # Secrets are counted in memory once the catalog is built
+        with patch.dict(global_scope, {'catalog': None}):
+            secrets.build_catalog()
+            self.assertEqual(self.get_statements(secrets.count), [])
+            self.assertEqual(secrets.count(), 3)
+
+            secrets.add(name='Some name')
+            self.assertEqual(secrets.count(), 4)
+            secrets.delete(1)
+            self.assertEqual(secrets.count(), 3)
+
     def test_get_by_id(self):
         self.assertEqual(secrets.get_by_id(1).name, 'Paypal')
 
@@ -68,9 +129,30 @@ class Test(BaseTest):
     def test_get_top_logins(self):
         assert secrets.get_top_logins() == ['gab@gmail.com', 'gab2@gmail.com']
 
+    def test_get_top_logins_plan(self):
+        # Logins are counted from the index
+        plans = self.query_plans(secrets.get_top_logins)
+        self.assertIn('USING COVERING INDEX ix_secrets_login', plans[0])
+
+    def test_search_plan(self):
+        # Case-insensitive prefix searches use the NOCASE indexes
+        for column in ['name', 'login', 'url']:
+            plans = self.query_plans(
+                lambda: get_session().query(SecretModel).filter(getattr(SecretModel, column).like('pay%')).all())
+            self.assertIn('USING INDEX ix_secrets_%s_nocase' % (column), plans[0])
+
     def test_add(self):
         self.assertTrue(secrets.add(name='Some name'))
 
+    def test_add_many(self):
+        self.assertTrue(secrets.add_many([
+            {'name': 'Some name', 'password': 'some password'},
+            {'name': 'Some other name', 'notes': 'some notes', 'category_id': 1},
+        ]))
+        self.assertEqual(secrets.count(), 5)
+        self.assertEqual(secrets.get_by_id(4).password, 'some password')
+        self.assertEqual(secrets.get_by_id(5).notes, 'some notes')
+
     def test_add_input(self):
         # Leave blank to correctly pass the notes input
         with patch('builtins.input', return_value='1'):
@@ -125,6 +207,229 @@ class Test(BaseTest):
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 1)
 
+    def test_search_fts(self):
+        # Substrings, case-insensitive, in names, URLs and logins
+        self.assertEqual([row.name for row in secrets.search('YPA')], ['Paypal'])
+        self.assertEqual([row.name for row in secrets.search('www.gmail')], ['Gmail'])
+        self.assertEqual(len(secrets.search('GMAIL.com')), 3)
+
+    def test_search_fts_2(self):
+        # Special characters are searched literally
+        self.assertEqual(secrets.search('"a" OR b*'), [])
+
+    def test_search_fts_3(self):
+        # The index follows updates and deletions
+        secret = secrets.get_by_id(1)
+        secret.name = 'Some new name'
+        get_session().commit()
+        self.assertEqual([row.id for row in secrets.search('paypal')], [secret.id])
+        self.assertEqual([row.id for row in secrets.search('new name')], [secret.id])
+
+        secret.url = ''
+        get_session().commit()
+        self.assertEqual(secrets.search('paypal'), [])
+
+        get_session().delete(secret)
+        get_session().commit()
+        self.assertEqual(secrets.search('new name'), [])
+
+    def test_search_fts_plan(self):
+        plans = self.query_plans(secrets.search, 'paypal')
+        self.assertIn('VIRTUAL TABLE INDEX', plans[0])
+        self.assertIn('SEARCH secrets USING INTEGER PRIMARY KEY', plans[0])
+        self.assertNotIn('SCAN secrets', plans[0].split(' / '))
+
+    def test_search_without_index(self):
+        # Vaults created without the full-text search index are searched with LIKE
+        with patch.dict(search_indexes, {global_scope['db_file']: False}):
+            self.assertEqual([row.name for row in secrets.search('YPA')], ['Paypal'])
+            self.assertEqual(len(secrets.search('GMAIL.com')), 3)
+            self.assertEqual(secrets.search('a%b'), [])
+            self.assertEqual([row.name for row in secrets.search_query('login:gab2')], ['eBay'])
+            self.assertEqual([row.name for row in secrets.search_query('url:*.ebay.com')], ['eBay'])
+
+            for func, query in [(secrets.search, 'paypal'), (secrets.search_query, 'url:*.ebay.com')]:
+                plans = self.query_plans(func, query)
+                self.assertNotIn('VIRTUAL TABLE', ' '.join(plans))
+
+    def test_search_query(self):
+        def names(query):
+            return [row.name for row in secrets.search_query(query)]
+
+        self.assertEqual(names('login:gab2'), ['eBay'])
+        self.assertEqual(names('name:^PAY'), ['Paypal'])
+        self.assertEqual(names('login:=GAB@gmail.com name:^g'), ['Gmail'])
+        self.assertEqual(names('url:*.ebay.com'), ['eBay'])
+        self.assertEqual(names('login:gab*gmail.com'), ['Paypal', 'Gmail', 'eBay'])
+        self.assertEqual(names('cat:"my category"'), ['Paypal'])
+        self.assertEqual(names('cat:"=My Category 1" pay'), ['Paypal'])
+        self.assertEqual(names('^e'), ['eBay'])
+
+    def test_search_query_prefix(self):
+        # Prefixes ending with `@`: the upper bound must not be `A`, sorted as `a` by NOCASE
+        secrets.add_many([{'name': 'Other 1', 'login': 'gab_x'}, {'name': 'Other 2', 'login': 'gab[x'},
+                          {'name': 'Other 3', 'login': 'GAB@other.com'}])
+        self.assertEqual([row.login for row in secrets.search_query('login:^gab@')],
+                         ['gab@gmail.com', 'gab@gmail.com', 'GAB@other.com'])
+        self.assertEqual([row.login for row in secrets.search_query('login:^gab[')], ['gab[x'])
+
+    def test_search_query_2(self):
+        # LIKE wildcards are searched literally
+        self.assertEqual(secrets.search_query('login:gab_'), [])
+        self.assertEqual(secrets.search_query('name:^p%'), [])
+        self.assertEqual(secrets.search_query('url:*%'), [])
+
+    def test_search_query_plan(self):
+        # Substrings use the full-text search index, short ones cannot
+        plans = self.query_plans(secrets.search_query, 'login:gab2')
+        self.assertIn('VIRTUAL TABLE INDEX 0:M', plans[0])
+        self.assertNotIn('SCAN secrets', plans[0].split(' / '))
+
+    def test_search_query_plan_2(self):
+        # Prefixes are range scans of the case-insensitive indexes
+        plans = self.query_plans(secrets.search_query, 'name:^pay')
+        self.assertIn('SEARCH secrets USING INDEX ix_secrets_name_nocase (name>? AND name<?)', plans[0])
+
+        plans = self.query_plans(secrets.search_query, '^pay')
+        self.assertIn('MULTI-INDEX OR', plans[0])
+        self.assertIn('ix_secrets_url_nocase (url>? AND url<?)', plans[0])
+
+    def test_search_query_plan_3(self):
+        # Exact values
+        plans = self.query_plans(secrets.search_query, 'login:=gab@gmail.com')
+        self.assertIn('SEARCH secrets USING INDEX ix_secrets_login_nocase (login=?)', plans[0])
+
+    def test_search_query_plan_4(self):
+        # Patterns starting with a wildcard use the full-text search index, others the column index
+        plans = self.query_plans(secrets.search_query, 'url:*.ebay.com')
+        self.assertIn('VIRTUAL TABLE INDEX 0:L', plans[0])
+        self.assertNotIn('SCAN secrets', plans[0].split(' / '))
+
+        plans = self.query_plans(secrets.search_query, 'url:https://www.e*')
+        self.assertIn('SEARCH secrets USING INDEX ix_secrets_url_nocase (url>? AND url<?)', plans[0])
+
+    def test_search_query_plan_5(self):
+        # Categories are matched first, then their secrets with the category index
+        for query, plan in [('cat:"=my category 1"', 'ix_categories_name_nocase (name=?)'),
+                            ('cat:^my', 'ix_categories_name_nocase (name>? AND name<?)'),
+                            ('cat:my*', 'ix_categories_name_nocase (name>? AND name<?)'),
+                            ('cat:category', 'SCAN categories')]:
+            plans = self.query_plans(secrets.search_query, query)
+            self.assertIn(plan, plans[0])
+            self.assertIn('SEARCH secrets USING INDEX ix_secrets_category_id (category_id=?)', plans[0])
+
+    def test_search_dispatch_6(self):
+        # Queries with fields or operators
+        self.assertEqual([row.name for row in secrets.search_dispatch('name:^g')], ['Gmail'])
+        with patch.object(secrets, 'search_query') as patched:
+            secrets.search_dispatch('paypal')
+            patched.assert_not_called()
+
+    def test_build_catalog(self):
+        with patch.dict(global_scope, {'catalog': None}):
+            catalog = secrets.build_catalog()
+            self.assertIs(global_scope['catalog'], catalog)
+            self.assertEqual(len(catalog), 3)
+            self.assertEqual(catalog.get(1).name, 'Paypal')
+
+    def test_catalog(self):
+        # Secrets are listed and searched in memory once the catalog is built
+        with patch.dict(global_scope, {'catalog': None}):
+            secrets.build_catalog()
+
+            with patch.object(secrets, 'get_session') as patched:
+                self.assertEqual([row.name for row in secrets.list_all()],
+                                 ['Paypal', 'Gmail', 'eBay'])
+                self.assertEqual(secrets.get_names(), ['Paypal', 'Gmail', 'eBay'])
+                self.assertEqual([row.name for row in secrets.search('ypa')], ['Paypal'])
+                self.assertEqual([row.name for row in secrets.search('gab2')], ['eBay'])
+                self.assertIsInstance(secrets.to_table(secrets.search('ypa')), str)
+            patched.assert_not_called()
+
+    def test_catalog_2(self):
+        # The catalog follows additions, updates and deletions
+        with patch.dict(global_scope, {'catalog': None}):
+            catalog = secrets.build_catalog()
+
+            secrets.add(name='Some name', login='some login')
+            self.assertEqual(len(catalog), 4)
+            self.assertEqual(catalog.get(4).login, 'some login')
+
+            secrets.add_many([{'name': 'Other name'}])
+            self.assertEqual(catalog.get(5).name, 'Other name')
+
+            with patch('builtins.input', return_value='New name'), patch('time.sleep'):
+                secrets.edit_input('name', secrets.get_by_id(4))
+            self.assertEqual(catalog.get(4).name, 'New name')
+
+            secrets.delete(4)
+            self.assertIsNone(catalog.get(4))
+            self.assertEqual(len(catalog), 4)
+
+    def test_list_all(self):
+        # Without a catalog, secrets are read from the database
+        self.assertEqual([row.name for row in secrets.list_all()],
+                         ['Paypal', 'Gmail', 'eBay'])
+
+    def test_iter_pages(self):
+        # Pages are read one at a time, after the last ID of the previous page
+        pages = secrets.iter_pages(page_size=2)
+        self.assertEqual(len(self.get_statements(next, pages)), 1)
+        self.assertEqual([[row.name for row in page] for page in pages], [['eBay']])
+
+        # From the catalog when the vault is unlocked
+        with patch.dict(global_scope, {'catalog': None}):
+            secrets.build_catalog()
+            pages = list(secrets.iter_pages(page_size=2))
+            self.assertEqual([[row.id for row in page] for page in pages], [[1, 2], [3]])
+
+        # Pages of the same size
+        self.assertEqual(len(list(secrets.iter_pages(page_size=3))), 1)
+
+    def test_format_page_row(self):
+        line = secrets.format_page_row([1, '', 'Some name\non two lines', 'x' * 40, ''])
+        self.assertEqual(line, '1       ' + ' ' * 16 + '  Some name on two lines' + ' ' * 6 + '  ' + 'x' * 29 + '...')
+
+    @patch.object(secrets, 'get_page_size', return_value=2)
+    def test_page_all(self, patched):
+        # The next page is read when the user asks for it
+        with patch('builtins.input', return_value='') as input_, \
+                patch('builtins.print') as print_:
+            self.assertTrue(secrets.page_all())
+        input_.assert_called_once()
+        self.assertIn('2 of 3 items', input_.call_args[0][0])
+        output = '\n'.join(str(call[0][0]) for call in print_.call_args_list if call[0])
+        self.assertIn('My category 1', output)
+        self.assertIn('eBay', output)
+
+    def test_page_all_2(self):
+        # Stop after the first page
+        with patch('builtins.input', return_value='x'), \
+                patch('builtins.print') as print_:
+            self.assertTrue(secrets.page_all(page_size=2))
+        output = '\n'.join(str(call[0][0]) for call in print_.call_args_list if call[0])
+        self.assertIn('Gmail', output)
+        self.assertNotIn('eBay', output)
+
+    def test_page_all_3(self):
+        self.session.query(SecretModel).delete()
+        self.session.commit()
+        with patch('builtins.print') as print_:
+            self.assertTrue(secrets.page_all())
+        print_.assert_called_once_with('Empty!')
+
+    def test_select_rows(self):
+        # Rows are read-only records, not added to the session
+        get_session().expunge_all()
+        rows = secrets.select_rows(SecretModel.login == 'gab@gmail.com')
+        self.assertEqual([(row.id, row.name, row.category_id) for row in rows],
+                         [(1, 'Paypal', 1), (2, 'Gmail', None)])
+        self.assertIsInstance(rows[0], CatalogRow)
+        self.assertEqual(len(get_session().identity_map), 0)
+
+        self.assertEqual(len(secrets.select_rows()), 3)
+        self.assertEqual(secrets.select_rows(SecretModel.id == 1234), [])
+
     def test_search_2(self):
         # Search with a login
         results = secrets.search('gab@gmail')
@@ -161,6 +466,31 @@ class Test(BaseTest):
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 1)
 
+    def test_search_dispatch_5(self):
+        # Fuzzy search, with or without the catalog
+        self.assertEqual(secrets.search_dispatch('paypl'), [])
+        self.assertEqual([row.name for row in secrets.search_dispatch('paypl', fuzzy=True)], ['Paypal'])
+
+        with patch.dict(global_scope, {'catalog': None}):
+            secrets.build_catalog()
+            self.assertEqual([row.name for row in secrets.search_dispatch('ebya', fuzzy=True)], ['eBay'])
+
+    @patch.object(secrets, 'search_results')
+    def test_search_input_7(self, patched):
+        # Searches without results fall back to a fuzzy search
+        patched.return_value = None
+        with patch('builtins.input', return_value='paypl'):
+            self.assertIsNone(secrets.search_input())
+        self.assertEqual([row.name for row in patched.call_args[0][0]], ['Paypal'])
+
+    @patch.object(secrets, 'search_results')
+    def test_search_input_8(self, patched):
+        # Explicit fuzzy search
+        patched.return_value = None
+        with patch('builtins.input', return_value='~paypal'):
+            self.assertIsNone(secrets.search_input())
+        self.assertEqual([row.name for row in patched.call_args[0][0]], ['Paypal'])
+
     def test_search_input(self):
         # Empty search
         with patch('builtins.input', return_value=''):
@@ -238,6 +568,19 @@ class Test(BaseTest):
         with patch('builtins.input', return_value='s'):
             self.assertEqual(secrets.item_menu(secrets.get_by_id(1)), 's')
 
+    def test_item_view_3(self):
+        # Each field is decrypted once while the secret is viewed
+        get_session().expunge_all()
+        item = secrets.get_by_id(1)
+        count = global_scope['enc'].decrypt_count
+
+        global_scope['conf'].update('hideSecretTTL', '0')
+        with patch('builtins.input', side_effect=['o', 'p', 's']), \
+                patch.object(secrets.clipboard, 'copy'), patch.object(secrets.clipboard, 'wait'):
+            self.assertEqual(secrets.item_view(item), 's')
+
+        self.assertEqual(global_scope['enc'].decrypt_count, count + 2)
+
     @patch.object(secrets, 'delete_confirm')
     def test_item_menu_2(self, patched):
         patched.return_value = None
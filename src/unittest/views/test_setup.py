@@ -2,21 +2,41 @@ from unittest.mock import patch
 import uuid
 
 from ..base import BaseTest
-from ...views import setup
+from ...views import setup, upgrade
 from ...models.base import get_session
 from ...models.User import UserModel
+from ...lib.KeyDerivation import KeyDerivation
 from ...modules.carry import global_scope
 
 
 class Test(BaseTest):
 
     def test_setup(self):
-        with patch('getpass.getpass', return_value=self.secret_key):
+        with patch('getpass.getpass', return_value=self.secret_key), \
+                patch.object(KeyDerivation, 'calibrate', return_value=1000):
             self.assertTrue(setup.initialize(self.config.salt))
+        self.assertEqual(self.config.kdfIterations, 1000)
+        self.assertTrue(self.config.rawKey)
+
+        # Restore the legacy key derivation for further tests
+        self.config.update('kdfIterations', 0, quiet=True)
+        self.config.update('rawKey', False, quiet=True)
 
     def test_create_db(self):
         self.assertTrue(setup.create_db())
 
+        # New vaults are created with the latest schema
+        self.assertEqual(upgrade.get_schema_version(),
+                         upgrade.get_latest_version())
+
+    def test_calibrate_kdf(self):
+        with patch.object(KeyDerivation, 'calibrate', return_value=1000):
+            self.assertEqual(setup.calibrate_kdf(250), 1000)
+        self.assertEqual(self.config.kdfIterations, 1000)
+
+        # Restore the legacy key derivation for further tests
+        self.config.update('kdfIterations', 0, quiet=True)
+
     def test_get_key_input(self):
         input_ = str(uuid.uuid4())
 
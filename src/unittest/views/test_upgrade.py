@@ -0,0 +1,326 @@
+from unittest.mock import patch
+import os
+
+from ..base import BaseTest
+from ...models.base import get_session
+from ...models import Secret
+from ...models.Secret import SecretModel
+from ...models.SecretPayload import SecretPayloadModel
+from ...models.User import UserModel
+from ...views import upgrade, secrets, users
+from ...modules.carry import global_scope
+from ...lib.Encryption import Encryption
+
+
+class Test(BaseTest):
+
+    def setUp(self):
+        # Create a secret with base 64 encoded fields (CBC and GCM)
+        secret = SecretModel(name='Paypal',
+                             url='https://www.paypal.com',
+                             login='gab@gmail.com')
+        secret._password = Encryption(global_scope['enc'].key, version=1) \
+            .encrypt_with_salt(secret.salt, b'password123')
+        secret._notes = global_scope['enc'].encrypt_with_salt(
+            secret.salt, b'Some notes')
+        self.session.add(secret)
+
+        # Create a secret with raw fields
+        secret = SecretModel(name='Gmail',
+                             password='password;123',
+                             notes='')
+        self.session.add(secret)
+
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.query(SecretModel).delete()
+        self.session.query(UserModel).filter(
+            UserModel.key != 'key_validation').delete()
+        self.session.commit()
+
+    def test_run(self):
+        with patch.dict(global_scope, {'enc': Encryption(global_scope['enc'].key)}):
+            self.assertTrue(upgrade.run())
+        self.assertEqual(upgrade.get_schema_version(),
+                         upgrade.get_latest_version())
+        self.assertIsNotNone(upgrade.get_setting('data_key'))
+        self.assertTrue(os.path.isfile(global_scope['db_file'] + '.backup'))
+
+    @patch.object(upgrade, 'backup')
+    @patch.object(upgrade, 'create_data_key')
+    @patch.object(upgrade, 'convert_raw_fields')
+    def test_run_2(self, patched, patched2, patched3):
+        # Upgrades are not run twice
+        upgrade.set_schema_version()
+        self.assertTrue(upgrade.run())
+        patched.assert_not_called()
+        patched2.assert_not_called()
+        patched3.assert_not_called()
+
+    def test_run_3(self):
+        # Steps are run in order, from the current version
+        upgrade.set_schema_version(1)
+        calls = []
+        steps = [
+            (1, 'Step 1', lambda: calls.append(1), False),
+            (2, 'Step 2', lambda: calls.append(2), False),
+            (3, 'Step 3', lambda: calls.append(3), False),
+        ]
+        with patch.object(upgrade, 'get_steps', return_value=steps), \
+                patch.object(upgrade, 'backup') as backup:
+            self.assertTrue(upgrade.run())
+        self.assertEqual(calls, [2, 3])
+        self.assertEqual(upgrade.get_schema_version(), 3)
+
+        # No step rewrites the vault, no backup
+        backup.assert_not_called()
+
+    def test_run_4(self):
+        # A failing step is rolled back and the vault stays at the previous version
+        def failing_step():
+            upgrade.set_setting('some_setting', 'value', commit=False)
+            raise ValueError()
+
+        steps = [
+            (1, 'Step 1', lambda: None, False),
+            (2, 'Step 2', failing_step, False),
+        ]
+        with patch.object(upgrade, 'get_steps', return_value=steps):
+            with self.assertRaises(upgrade.UpgradeError) as context:
+                upgrade.run()
+        self.assertEqual(upgrade.get_schema_version(), 1)
+        self.assertIsNone(upgrade.get_setting('some_setting'))
+
+        # The error tells which step failed
+        self.assertEqual(context.exception.version, 2)
+        self.assertEqual(context.exception.description, 'Step 2')
+        self.assertIsNone(context.exception.backup_path)
+        self.assertIsInstance(context.exception.__cause__, ValueError)
+
+    def test_run_6(self):
+        # Schema changes of a failing step are rolled back too
+        get_session().execute('DROP INDEX ix_secrets_login')
+        get_session().commit()
+        self.addCleanup(lambda: upgrade.create_indexes() and get_session().commit())
+        upgrade.set_schema_version(2)
+
+        def failing_step():
+            upgrade.create_indexes()
+            get_session().execute('CREATE TABLE some_table (id INTEGER)')
+            raise ValueError()
+
+        steps = [(3, 'Step 3', failing_step, False)]
+        with patch.object(upgrade, 'get_steps', return_value=steps):
+            self.assertRaises(upgrade.UpgradeError, upgrade.run)
+        self.assertEqual(upgrade.get_schema_version(), 2)
+
+        names = [row[0] for row in get_session().execute('SELECT name FROM sqlite_master')]
+        self.assertNotIn('ix_secrets_login', names)
+        self.assertNotIn('some_table', names)
+
+        # The connection is back to its usual transactions
+        self.assertEqual(get_session().connection().connection.connection.isolation_level, '')
+
+    def test_get_schema_version(self):
+        self.assertEqual(upgrade.get_schema_version(), 0)
+
+    def test_set_schema_version(self):
+        self.assertTrue(upgrade.set_schema_version(1))
+        self.assertEqual(upgrade.get_schema_version(), 1)
+        self.assertTrue(upgrade.set_schema_version())
+        self.assertEqual(upgrade.get_schema_version(),
+                         upgrade.get_latest_version())
+
+    def test_backup(self):
+        path = upgrade.backup()
+        self.assertEqual(path, global_scope['db_file'] + '.backup')
+        with open(path, 'rb') as backup, open(global_scope['db_file'], 'rb') as db:
+            self.assertEqual(backup.read(), db.read())
+        os.remove(path)
+
+    def test_get_setting(self):
+        self.assertIsNone(upgrade.get_setting('some_setting'))
+
+    def test_set_setting(self):
+        self.assertTrue(upgrade.set_setting('some_setting', 'value'))
+        self.assertTrue(upgrade.set_setting('some_setting', 'new value'))
+        self.assertEqual(upgrade.get_setting('some_setting'), 'new value')
+        self.assertEqual(self.session.query(UserModel).filter(
+            UserModel.key == 'some_setting').count(), 1)
+
+    def test_convert_raw_fields(self):
+        # Only the base 64 encoded secret is converted
+        self.assertEqual(upgrade.convert_raw_fields(), 1)
+        self.assertEqual(upgrade.convert_raw_fields(), 0)
+        get_session().commit()
+
+        self.session.expire_all()
+        secret = self.session.query(SecretModel).get(1)
+        self.assertEqual(secret._password[0], 1)
+        self.assertEqual(secret._notes[0], 2)
+        self.assertEqual(secret.password, 'password123')
+        self.assertEqual(secret.notes, 'Some notes')
+
+    def test_create_data_key(self):
+        enc = Encryption(global_scope['enc'].key)
+        with patch.dict(global_scope, {'enc': enc}):
+            self.assertEqual(upgrade.create_data_key(), 2)
+
+            # The data key is used once it is saved
+            self.assertIsNone(enc.data_key)
+            get_session().commit()
+            self.assertIsNotNone(upgrade.get_setting('data_key'))
+            self.assertTrue(users.data_key_load())
+            self.assertIsNotNone(enc.data_key)
+
+            # Secrets are encrypted with the data key
+            self.session.expire_all()
+            secret = self.session.query(SecretModel).get(2)
+            self.assertEqual(secret.password, 'password;123')
+            enc.data_key = None
+            secret.forget_decrypted()
+            self.assertRaises(ValueError, getattr, secret, 'password')
+
+    def make_legacy_layout(self):
+        """
+            Store the encrypted fields in the `secrets` table, as vaults did before schema version 6
+        """
+
+        for column, type_ in [('_password', 'BLOB'), ('_notes', 'BLOB'), ('_salt', 'VARCHAR')]:
+            get_session().execute('ALTER TABLE secrets ADD COLUMN %s %s' % (column, type_))
+            get_session().execute(
+                'UPDATE secrets SET %s = (SELECT %s FROM secret_payloads WHERE secret_payloads.id = secrets.id)' % (column, column))
+        get_session().execute('DROP TABLE secret_payloads')
+        get_session().commit()
+
+    def test_move_payloads(self):
+        self.make_legacy_layout()
+
+        self.assertEqual(upgrade.move_payloads(), 2)
+        get_session().commit()
+        self.assertEqual(upgrade.move_payloads(), 0)
+
+        # Encrypted fields are read from the new table
+        get_session().expunge_all()
+        columns = [row[1] for row in get_session().execute('PRAGMA table_info(secrets)')]
+        self.assertNotIn('_password', columns)
+        self.assertEqual(secrets.get_by_id(2).password, 'password;123')
+
+        # The search index, its triggers and the indexes are kept
+        self.assertEqual(len(secrets.search('paypal')), 1)
+        secrets.add(name='Some name', password='some password')
+        self.assertEqual(len(secrets.search('some name')), 1)
+        plans = self.query_plans(secrets.get_top_logins)
+        self.assertIn('USING COVERING INDEX ix_secrets_login', plans[0])
+
+    def test_move_payloads_2(self):
+        # SQLite libraries that cannot drop columns rebuild the table
+        self.make_legacy_layout()
+
+        with patch.object(upgrade, 'supports_drop_column', return_value=False):
+            self.assertEqual(upgrade.move_payloads(), 2)
+        get_session().commit()
+
+        get_session().expunge_all()
+        columns = [row[1] for row in get_session().execute('PRAGMA table_info(secrets)')]
+        self.assertEqual(columns, ['id', 'name', 'url', 'login', 'category_id'])
+        self.assertEqual(secrets.get_by_id(2).password, 'password;123')
+
+        # Indexes and triggers are created again
+        plans = self.query_plans(secrets.get_top_logins)
+        self.assertIn('USING COVERING INDEX ix_secrets_login', plans[0])
+        self.assertEqual(len(secrets.search('paypal')), 1)
+        secrets.add(name='Some name', password='some password')
+        self.assertEqual(len(secrets.search('some name')), 1)
+        secrets.delete(1)
+        self.assertEqual(secrets.search('paypal'), [])
+        self.assertEqual(get_session().query(SecretPayloadModel).count(), 2)
+
+    def test_supports_drop_column(self):
+        self.assertIsInstance(upgrade.supports_drop_column(), bool)
+
+    def test_create_data_key_2(self):
+        # A failing upgrade leaves the vault and its key without a data key
+        enc = Encryption(global_scope['enc'].key)
+        upgrade.set_schema_version(1)
+        with patch.dict(global_scope, {'enc': enc}), \
+                patch.object(upgrade, 'set_setting', side_effect=ValueError()), \
+                patch.object(upgrade, 'backup', return_value='some path'):
+            with self.assertRaises(upgrade.UpgradeError) as context:
+                upgrade.run()
+
+        self.assertEqual(context.exception.version, 2)
+        self.assertEqual(context.exception.backup_path, 'some path')
+        self.assertIsNone(enc.data_key)
+        self.assertIsNone(upgrade.get_setting('data_key'))
+
+    def test_run_5(self):
+        # Vaults with encrypted fields in the `secrets` table are upgraded from any version
+        self.make_legacy_layout()
+        upgrade.set_schema_version(0)
+
+        with patch.dict(global_scope, {'enc': Encryption(global_scope['enc'].key)}):
+            self.assertTrue(upgrade.run())
+            self.assertEqual(upgrade.get_schema_version(), upgrade.get_latest_version())
+            users.data_key_load()
+
+            get_session().expunge_all()
+            self.assertEqual(secrets.get_by_id(1).password, 'password123')
+            self.assertEqual(secrets.get_by_id(2).password, 'password;123')
+
+    def test_delete_payload(self):
+        # Payloads are deleted with their secret, even by bulk deletes
+        self.session.query(SecretModel).filter(SecretModel.id == 1).delete()
+        self.session.commit()
+        self.assertEqual(self.session.query(SecretPayloadModel).count(), 1)
+
+    def test_create_indexes(self):
+        get_session().execute('DROP INDEX ix_secrets_login')
+        get_session().execute('DROP INDEX ix_secrets_name_nocase')
+        get_session().commit()
+
+        self.assertEqual(upgrade.create_indexes(), 2)
+        get_session().commit()
+        self.assertEqual(upgrade.create_indexes(), 0)
+
+        # Indexes are used again
+        plans = self.query_plans(secrets.get_top_logins)
+        self.assertIn('USING COVERING INDEX ix_secrets_login', plans[0])
+
+    def test_create_search_index(self):
+        get_session().execute('DROP TABLE secrets_fts')
+        get_session().execute('DROP TRIGGER secrets_fts_insert')
+        get_session().commit()
+
+        # Existing secrets are indexed
+        self.assertEqual(upgrade.create_search_index(), 2)
+        get_session().commit()
+        self.assertEqual(len(secrets.search('paypal')), 1)
+
+        # New secrets as well
+        secrets.add(name='Some name')
+        self.assertEqual(len(secrets.search('some name')), 1)
+
+    def test_create_search_index_2(self):
+        # Skipped when the SQLite library has no trigrams, secrets are searched with LIKE
+        for name in ['insert', 'update', 'delete']:
+            get_session().execute('DROP TRIGGER secrets_fts_%s' % (name))
+        get_session().execute('DROP TABLE secrets_fts')
+        get_session().commit()
+
+        with patch.object(Secret, 'trigram_support', False):
+            self.assertEqual(upgrade.create_search_index(), 0)
+            get_session().commit()
+
+            self.assertEqual(len(secrets.search('paypal')), 1)
+            secrets.add(name='Some name')
+            self.assertEqual(len(secrets.search('some name')), 1)
+
+        # The index is created once the library supports it
+        self.assertEqual(upgrade.create_search_index(), 3)
+        get_session().commit()
+        self.assertEqual(len(secrets.search('some name')), 1)
+
+    def test_vacuum(self):
+        self.assertTrue(upgrade.vacuum())
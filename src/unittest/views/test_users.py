@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from ..base import BaseTest
 from ...models.base import get_session, sessions
 from ...models import base
@@ -80,3 +82,41 @@ class Test(BaseTest):
 
         enc = Encryption(b'new key')
         self.assertFalse(users.validation_key_rekey(enc))
+
+    def test_data_key_new(self):
+        enc = Encryption(self.secret_key.encode())
+        with patch.dict(global_scope, {'enc': enc}):
+            self.assertTrue(users.data_key_new())
+            self.assertIsNotNone(enc.data_key)
+
+    def test_data_key_load(self):
+        enc = Encryption(self.secret_key.encode())
+        with patch.dict(global_scope, {'enc': enc}):
+            users.data_key_new()
+            data_key = bytes(enc.data_key)
+            enc.data_key = None
+
+            self.assertTrue(users.data_key_load())
+            self.assertEqual(enc.data_key, data_key)
+
+    def test_data_key_load_2(self):
+        # Vault without a data key
+        self.assertFalse(users.data_key_load())
+
+    def test_data_key_rekey(self):
+        enc = Encryption(self.secret_key.encode())
+        with patch.dict(global_scope, {'enc': enc}):
+            users.data_key_new()
+
+            newenc = Encryption(b'new key')
+            self.assertTrue(users.data_key_rekey(newenc))
+            self.assertEqual(newenc.data_key, enc.data_key)
+
+            # The data key can be decrypted with the new key
+            with patch.dict(global_scope, {'enc': Encryption(b'new key')}):
+                self.assertTrue(users.data_key_load())
+                self.assertEqual(global_scope['enc'].data_key, enc.data_key)
+
+    def test_data_key_rekey_2(self):
+        # Vault without a data key
+        self.assertFalse(users.data_key_rekey(Encryption(b'new key')))
@@ -52,7 +52,7 @@ def check_directory(vault_path, config_path):
     return None
 
 
-def config_update(clipboard_TTL=None, auto_lock_TTL=None, hide_secret_TTL=None):
+def config_update(clipboard_TTL=None, auto_lock_TTL=None, hide_secret_TTL=None, cache_size=None):
     """
         Update config
     """
@@ -63,9 +63,11 @@ def config_update(clipboard_TTL=None, auto_lock_TTL=None, hide_secret_TTL=None):
         return global_scope['conf'].update('autoLockTTL', auto_lock_TTL)
     elif hide_secret_TTL:
         return global_scope['conf'].update('hideSecretTTL', hide_secret_TTL)
+    elif cache_size:
+        return global_scope['conf'].update('cacheSize', cache_size)
 
 
-def initialize(vault_location_override, config_location_override, erase=None, clipboard_TTL=None, auto_lock_TTL=None, hide_secret_TTL=None, rekey_vault=None, import_items=None, export=None, file_format='json'):
+def initialize(vault_location_override, config_location_override, erase=None, clipboard_TTL=None, auto_lock_TTL=None, hide_secret_TTL=None, rekey_vault=None, calibrate_kdf=None, convert_db=None, kdf_iter=None, cipher_page_size=None, cache_size=None, import_items=None, export=None, file_format='json'):
     # Some nice ascii art
     logo()
 
@@ -96,16 +98,31 @@ def initialize(vault_location_override, config_location_override, erase=None, cl
         sys.exit()
 
     # Update config
-    config_update(clipboard_TTL, auto_lock_TTL, hide_secret_TTL)
+    config_update(clipboard_TTL, auto_lock_TTL, hide_secret_TTL, cache_size)
 
     # Change vault key
     if rekey_vault:
         print()
-        # print("Please consider backing up your vault located at `%s` before proceeding." % (
-        #     vault_path))
-        # change_key.rekey()
-        print('This feature is not currently implemented.')
-        print('Please export the vault to a Json file, create a new vault with the new key and import the Json file in the new vault.')
+        print("Please consider backing up your vault located at `%s` before proceeding." % (
+            vault_path))
+        change_key.rekey()
+        sys.exit()
+
+    # Calibrate the master key derivation
+    if calibrate_kdf:
+        print()
+        print("Please consider backing up your vault located at `%s` before proceeding." % (
+            vault_path))
+        change_key.calibrate(calibrate_kdf)
+        sys.exit()
+
+    # Convert the vault to new SQLCipher settings
+    if convert_db:
+        print()
+        print("Please consider backing up your vault located at `%s` before proceeding." % (
+            vault_path))
+        change_key.convert_db(raw_key=convert_db == 'raw',
+                              kdf_iter=kdf_iter, page_size=cipher_page_size)
         sys.exit()
 
     # Import items in the vault
@@ -147,6 +164,16 @@ def main():
                         type=str, help="Set config path")
     parser.add_argument("-k", "--change_key",
                         action='store_true', help="Change master key")
+    parser.add_argument("-u", "--calibrate_kdf", type=int,
+                        help="Tune the master key derivation to unlock the vault in the given time (in milliseconds, default: 250)", nargs='?', const=250)
+    parser.add_argument("-o", "--convert_db", type=str, help="Re-encrypt the vault with a raw key (the master key derivation is calibrated first if needed) or a passphrase, using --kdf_iter and --cipher_page_size (default: 'raw')",
+                        choices=['raw', 'passphrase'], nargs='?', const='raw')
+    parser.add_argument("-n", "--kdf_iter", type=int,
+                        help="SQLCipher key derivation iterations, for --convert_db in passphrase mode")
+    parser.add_argument("-g", "--cipher_page_size", type=int,
+                        help="SQLCipher page size, for --convert_db")
+    parser.add_argument("-s", "--cache_size", type=int,
+                        help="Set SQLite page cache size (in pages, or in KiB when negative)")
     parser.add_argument("-i", "--import_items", type=str,
                         help="File to import credentials from")
     parser.add_argument("-x", "--export", type=str,
@@ -164,6 +191,11 @@ def main():
                auto_lock_TTL=args.auto_lock_TTL,
                hide_secret_TTL=args.hide_secret_TTL,
                rekey_vault=args.change_key,
+               calibrate_kdf=args.calibrate_kdf,
+               convert_db=args.convert_db,
+               kdf_iter=args.kdf_iter,
+               cipher_page_size=args.cipher_page_size,
+               cache_size=args.cache_size,
                import_items=args.import_items,
                export=args.export,
                file_format=args.file_format)
@@ -1,22 +1,35 @@
 # Categories view
 
 import time
+from collections import namedtuple
 
+from sqlalchemy import func
 from tabulate import tabulate
 
 from ..models.base import get_session
 from ..models.Category import CategoryModel
 from ..models.Secret import SecretModel
 from ..modules.misc import confirm, clear_screen
+from ..modules.carry import global_scope
 from . import menu
 
 
+# A category as listed by `all()`, read-only and not attached to the session
+CategoryRow = namedtuple('CategoryRow', ['id', 'name'])
+
+
 def all():
     """
-        Return a list of all categories
+        Return a list of all categories (`CategoryRow`)
     """
 
-    return get_session().query(CategoryModel).filter(CategoryModel.active == 1).order_by(CategoryModel.id).all()
+    # Read from the cache when the vault is unlocked
+    cache = global_scope['categories']
+    if cache is not None:
+        return [CategoryRow(id_, name) for id_, name in cache.items()]
+
+    return [CategoryRow(*row) for row in get_session().query(CategoryModel.id, CategoryModel.name)
+            .filter(CategoryModel.active == 1).order_by(CategoryModel.id)]
 
 
 def to_table(rows=[]):
@@ -24,11 +37,13 @@ def to_table(rows=[]):
         Transform rows in a table
     """
 
-    # Retrieve id and name
-    cats = [[cat.id, cat.name] for cat in rows]
+    counts = get_counts()
+
+    # Retrieve id, name and number of secrets
+    cats = [[cat.id, cat.name, counts.get(cat.id, 0)] for cat in rows]
 
     if len(cats) > 0:
-        return tabulate(cats, headers=['Item', 'Category name'])
+        return tabulate(cats, headers=['Item', 'Category name', 'Items'])
     else:
         return 'Empty!'
 
@@ -76,6 +91,9 @@ def exists(id_):
         Check if a category ID exists
     """
 
+    if global_scope['categories'] is not None:
+        return int(id_) in global_scope['categories']
+
     if get_session().query(CategoryModel).filter(CategoryModel.id == int(id_)).filter(CategoryModel.active == 1).first():
         return True
 
@@ -90,6 +108,9 @@ def get_name(id_):
     if not id_:
         return ''
 
+    if global_scope['categories'] is not None:
+        return global_scope['categories'].get(int(id_), '')
+
     cat = get_session().query(CategoryModel).filter(
         CategoryModel.id == int(id_)).filter(CategoryModel.active == 1).first()
 
@@ -99,6 +120,77 @@ def get_name(id_):
     return ''
 
 
+def get_names():
+    """
+        Return the names of all categories, by ID
+    """
+
+    if global_scope['categories'] is not None:
+        return dict(global_scope['categories'])
+
+    return load_names()
+
+
+def load_names():
+    """
+        Return the names of all categories, by ID, loaded from the database
+    """
+
+    return dict(get_session().query(CategoryModel.id, CategoryModel.name)
+                .filter(CategoryModel.active == 1).order_by(CategoryModel.id))
+
+
+def index_names(names):
+    """
+        Return the categories IDs by name, the lowest ID is kept for duplicate names
+    """
+
+    ids = {}
+    for id_, name in names.items():
+        if name not in ids or id_ < ids[name]:
+            ids[name] = id_
+
+    return ids
+
+
+def index_name(name, id_):
+    """
+        Add a category to the in-memory map of IDs by name
+    """
+
+    ids = global_scope['category_ids']
+    if name not in ids or id_ < ids[name]:
+        ids[name] = id_
+
+
+def unindex_name(name, id_):
+    """
+        Remove a category from the in-memory map of IDs by name,
+        another category with the same name takes its place
+    """
+
+    ids = global_scope['category_ids']
+    if ids.get(name) != id_:
+        return
+
+    del ids[name]
+    for other_id, other_name in global_scope['categories'].items():
+        if other_name == name:
+            index_name(other_name, other_id)
+
+
+def build_cache():
+    """
+        Load the in-memory maps of categories names and IDs. They are then updated
+        by `add()`, `rename()` and `delete()`.
+    """
+
+    global_scope['categories'] = load_names()
+    global_scope['category_ids'] = index_names(global_scope['categories'])
+
+    return global_scope['categories']
+
+
 def get_id(name):
     """
         Get a category ID from a category name
@@ -107,6 +199,9 @@ def get_id(name):
     if not name:
         return None
 
+    if global_scope['categories'] is not None:
+        return global_scope['category_ids'].get(name)
+
     cat = get_session().query(CategoryModel).filter(
         CategoryModel.name == name).filter(CategoryModel.active == 1).first()
 
@@ -125,6 +220,10 @@ def add(name):
     get_session().add(cat)
     get_session().commit()
 
+    if global_scope['categories'] is not None:
+        global_scope['categories'][cat.id] = name
+        index_name(name, cat.id)
+
     return True
 
 
@@ -164,6 +263,12 @@ def rename(id_, new_name):
         get_session().add(cat)
         get_session().commit()
 
+        if global_scope['categories'] is not None:
+            old_name = global_scope['categories'][cat.id]
+            global_scope['categories'][cat.id] = new_name
+            unindex_name(old_name, cat.id)
+            index_name(new_name, cat.id)
+
         return True
 
     return False
@@ -212,6 +317,10 @@ def delete(id_):
         get_session().add(cat)
         get_session().commit()
 
+        if global_scope['categories'] is not None:
+            name = global_scope['categories'].pop(cat.id, None)
+            unindex_name(name, cat.id)
+
         return True
 
     return False
@@ -255,6 +364,9 @@ def is_used(id_):
         Check if a category ID is used by any secret
     """
 
+    if global_scope['catalog'] is not None:
+        return global_scope['catalog'].get_category_count(int(id_)) > 0
+
     if get_session().query(SecretModel).filter(
             SecretModel.category_id == int(id_)).first():
         return True
@@ -262,6 +374,19 @@ def is_used(id_):
     return False
 
 
+def get_counts():
+    """
+        Return the number of secrets of each category, by category ID
+    """
+
+    # The catalog keeps count when the vault is unlocked
+    if global_scope['catalog'] is not None:
+        return dict(global_scope['catalog'].category_counts)
+
+    return dict(get_session().query(SecretModel.category_id, func.count())
+                .group_by(SecretModel.category_id))
+
+
 def main_menu():
     """
         Categories menu
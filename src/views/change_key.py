@@ -1,5 +1,6 @@
 # Import/export view
 
+import os
 import sys
 
 from sqlalchemy.orm import Session
@@ -8,8 +9,9 @@ from . import menu, secrets
 from .setup import get_key_input
 from ..modules.carry import global_scope
 from ..lib.Encryption import Encryption
-from .users import validation_key_rekey
-from ..models.base import Base, get_session, get_engine
+from ..lib.KeyDerivation import KeyDerivation
+from .users import validation_key_rekey, data_key_rekey
+from ..models.base import Base, get_session, get_engine, get_db_passphrase, drop_sessions
 from ..models.Category import CategoryModel  # Imported for schema creation
 from ..models.Secret import SecretModel  # Imported for schema creation
 from ..models.User import UserModel  # Imported for schema creation
@@ -20,7 +22,8 @@ enc_current = enc_new = None
 def rekey():
     """
         Change the master key. This involves 3 steps:
-         - Looping thru all secrets and encrypting them with the new key
+         - Encrypting the data key with the new key (or, for vaults without
+           a data key, looping thru all secrets and encrypting them with the new key)
          - Updating the validation key
          - Re-keying the database
     """
@@ -42,8 +45,12 @@ def rekey():
         # Set instance of new Encryption class
         enc_new = Encryption(newkey.encode())
 
-        # Loop thru all secrets and encrypt them with the new key
-        rekey_secrets()
+        if enc_current.data_key:
+            # Encrypt the data key with the new key
+            rekey_data_key()
+        else:
+            # Loop thru all secrets and encrypt them with the new key
+            rekey_secrets()
 
         # Re-key the validation key with the new master key
         rekey_validation_key()
@@ -64,26 +71,24 @@ def rekey_secrets():
         Loop thru all secrets and encrypt them with the new key
     """
 
-    for secret in secrets.all():
-        # Get current values
-        password = secret.password
-        notes = secret.notes
+    rows = secrets.all(encrypted=True)
 
-        # Set Encryption to new class
-        global_scope['enc'] = enc_new
+    # Decrypt with the current key and encrypt with the new key in batches
+    SecretModel.encrypt_many(
+        rows, SecretModel.decrypt_many(rows, enc_current), enc_new)
 
-        # Update password, notes
-        secret.password = password
-        secret.notes = notes
+    get_session().add_all(rows)
+    get_session().commit()
 
-        # Revert Encryption to current class
-        global_scope['enc'] = enc_current
+    return True
 
-        get_session().add(secret)
 
-    get_session().commit()
+def rekey_data_key():
+    """
+        Encrypt the data key with the new master key, secrets are left untouched
+    """
 
-    return True
+    return data_key_rekey(enc_new)
 
 
 def rekey_validation_key():
@@ -99,41 +104,124 @@ def rekey_db():
         Change the db encryption key
     """
 
-    # # Get engine with rekey
-    # engine = get_engine(add_to_connection_string='?rekey=' +
-    #                     enc_new.key.decode('utf-8'))
+    # Use the new key from now on
+    global_scope['enc'] = enc_new
+
+    # Re-encrypt the database file with the new key
+    get_session().execute('PRAGMA rekey="%s"' % (get_db_passphrase()))
+
+    # Drop db sessions to force a re-connection with the new key
+    drop_sessions()
+
+    return True
+
+
+def calibrate(unlock_time=250):
+    """
+        Benchmark the machine, pick key derivation parameters matching
+        `unlock_time` (in milliseconds) and re-key the database accordingly.
+        The vault is switched to a raw key: SQLCipher then skips its own key derivation
+        and unlocking only takes the calibrated one.
+    """
+
+    # Ask user to unlock the vault
+    print('\n* Please enter your master key:')
+    unlock()
 
-    # # Create new session
-    # session = Session(bind=engine)
-    # session.commit()
+    iterations = KeyDerivation().calibrate(unlock_time)
 
-    # # Update global scope
-    # global_scope['enc'] = enc_new
+    # Re-encrypt the database file with the key derived with the new parameters
+    export_db(raw_key=True, page_size=global_scope['conf'].cipherPageSize, iterations=iterations)
 
-    print('Change the db encryption key: not implemented!')
+    print('\nThe vault will now take about %d ms to unlock (%d iterations).' % (
+        unlock_time, iterations))
 
-    return None
+    return True
 
 
-# def new_db_get_engine():
-#     """
-#         Will return a SQLite engine with the new key and a temporary location
-#     """
+def convert_db(raw_key=True, kdf_iter=None, page_size=None):
+    """
+        Copy the database to a new file encrypted with different SQLCipher settings
+        (raw key or passphrase, `kdf_iter`, `cipher_page_size`) using `sqlcipher_export`,
+        then replace the vault with the new file
+    """
 
-#     # Save db file
-#     db_file = global_scope['db_file']
+    # Ask user to unlock the vault
+    print('\n* Please enter your master key:')
+    unlock()
 
-#     # Update global scope
-#     global_scope['enc'] = enc_new
-#     global_scope['db_file'] = db_file + '.new'
+    # Raw keys are used as-is by SQLCipher, which skips its own key derivation:
+    # vaults without key stretching are calibrated first
+    iterations = None
+    if raw_key and not global_scope['conf'].kdfIterations:
+        iterations = KeyDerivation().calibrate()
+        print('\nThe master key derivation has been calibrated (%d iterations).' % (iterations))
 
-#     # Create engine
-#     engine = get_engine()
+    export_db(raw_key, kdf_iter, page_size, iterations)
 
-#     # Restore db file
-#     global_scope['db_file'] = db_file
+    print('\nYour vault has been converted.')
 
-#     return engine
+    return True
+
+
+def export_db(raw_key=True, kdf_iter=None, page_size=None, iterations=None):
+    """
+        Export the unlocked database to a new file with the given SQLCipher settings,
+        replace the vault file and save the settings.
+        `iterations` overrides the master key derivation iterations (`kdfIterations`).
+    """
+
+    if iterations is None:
+        iterations = global_scope['conf'].kdfIterations or 0
+
+    # A raw key derived with a single SHA-256 would leave the vault without key stretching
+    if raw_key and not iterations:
+        raise ValueError('Raw SQLCipher keys require a calibrated key derivation (`kdfIterations`).')
+
+    db_file = global_scope['db_file']
+    converted = db_file + '.converted'
+    if os.path.isfile(converted):
+        os.remove(converted)
+
+    # Export the whole database to a new file with the new settings
+    session = get_session()
+    session.execute('ATTACH DATABASE \'%s\' AS converted KEY "%s"' % (
+        converted, get_db_passphrase(iterations, raw_key=raw_key)))
+    if kdf_iter and not raw_key:
+        session.execute('PRAGMA converted.kdf_iter = %d' % (kdf_iter))
+    if page_size:
+        session.execute('PRAGMA converted.cipher_page_size = %d' % (page_size))
+    session.execute("SELECT sqlcipher_export('converted')")
+    session.execute('DETACH DATABASE converted')
+    session.close()
+
+    # Drop db sessions to force a re-connection with the new settings
+    drop_sessions()
+
+    # Save the settings needed to open the new file, then replace the vault with it.
+    # If the settings cannot be saved, the vault is left untouched.
+    previous = {name: global_scope['conf'].get_config().get(name)
+                for name in ['kdfIterations', 'rawKey', 'cipherKdfIter', 'cipherPageSize']}
+    try:
+        global_scope['conf'].update_many({
+            'kdfIterations': iterations,
+            'rawKey': raw_key,
+            'cipherKdfIter': 0 if raw_key else kdf_iter or 0,
+            'cipherPageSize': page_size or 0,
+        })
+    except Exception:
+        os.remove(converted)
+        raise
+
+    try:
+        os.replace(converted, db_file)
+    except Exception:
+        # Restore the settings of the vault file
+        global_scope['conf'].update_many({name: value if value is not None else 0
+                                          for name, value in previous.items()})
+        raise
+
+    return True
 
 
 def unlock():
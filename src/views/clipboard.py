@@ -56,7 +56,7 @@ def wait():
 
     try:
         # Loop until the delay is elapsed
-        for i in range(0, int(global_scope['conf'].clipboardTTL)):
+        for i in range(0, global_scope['conf'].clipboardTTL):
             print('.', end='', flush=True)
             time.sleep(1)  # Sleep 1 sec
 
@@ -9,6 +9,7 @@ from . import menu, secrets, categories
 from ..modules.misc import confirm
 from ..modules.carry import global_scope
 from ..lib.Encryption import Encryption
+from ..models.Secret import SecretModel
 
 """
     Adding import or export formats:
@@ -54,16 +55,20 @@ def export_to_json(path):
     # Ask user to unlock the vault
     unlock()
 
+    # Decrypt all passwords and notes in one batch
+    rows = secrets.all(encrypted=True)
+    values = SecretModel.decrypt_many(rows)
+
     # Create dict of secrets
     out = []
-    for secret in secrets.all():
+    for secret, (password, notes) in zip(rows, values):
         out.append({
             'name': secret.name,
             'url': secret.url,
             'login': secret.login,
-            'password': secret.password,
-            'notes': secret.notes,
-            'category': categories.get_name(secret.category_id),
+            'password': password,
+            'notes': notes,
+            'category': secret.category_name,
         })
 
     return save_file(path, json.dumps(out))
@@ -105,6 +110,7 @@ def import_items(rows):
         [{'name': '...', 'url': '...', 'login': '...', 'password': '...', 'notes': '...', 'category': '...'}]
     """
 
+    items = []
     for row in rows:
         # Set category ID
         category_id = None
@@ -117,13 +123,10 @@ def import_items(rows):
                 categories.add(name=row['category'])
                 category_id = categories.get_id(row['category'])
 
-        # Create secret
-        secrets.add(name=row.get('name'),
-                    url=row.get('url'),
-                    login=row.get('login'),
-                    password=row.get('password'),
-                    notes=row.get('notes'),
-                    category_id=category_id)
+        items.append(dict(row, category_id=category_id))
+
+    # Create secrets
+    secrets.add_many(items)
 
     print('%d items have been imported.' % len(rows))
 
@@ -3,10 +3,11 @@ import time
 import getpass
 
 from ..modules.carry import global_scope
-from ..models.base import get_engine, get_session
+from ..models.base import get_engine, get_session, drop_sessions
+from ..models.Secret import SecretModel
 from ..modules.misc import lock_prefix, clear_screen, logo_small
 from ..lib.Encryption import Encryption
-from . import secrets, users, categories
+from . import secrets, users, categories, upgrade
 
 timer = None
 
@@ -76,10 +77,32 @@ def validate_key(key):
     """
 
     # Create instance of Encryption class with the given key
-    global_scope['enc'] = Encryption(key.encode())
+    global_scope['enc'] = Encryption(
+        key.encode(), version=global_scope['conf'].keyVersion or 1)
 
     # Attempt to unlock the database
-    return users.validation_key_validate(key.encode())
+    start = time.perf_counter()
+    if users.validation_key_validate(key.encode()):
+        print('Vault unlocked in %d ms.' % ((time.perf_counter() - start) * 1000))
+
+        try:
+            upgrade.run()
+        except upgrade.UpgradeError as error:
+            print()
+            print('Upgrade %d of %d (%s) failed: %s' % (
+                error.version, upgrade.get_latest_version(), error.description, error.__cause__))
+            print('Your vault was left as it was before this upgrade.')
+            if error.backup_path:
+                print('A backup of your vault was saved to `%s` before upgrading.' % (error.backup_path))
+            print()
+            sys.exit()
+        users.data_key_load()
+        secrets.build_catalog()
+        categories.build_cache()
+
+        return True
+
+    return False
 
 
 def menu(next_command=None):
@@ -118,7 +141,7 @@ def menu(next_command=None):
             next_command = secrets.search_input()
         elif command == 'all':  # Show all items
             print()
-            print(secrets.to_table(secrets.all()))
+            secrets.page_all()
             next_command = secrets.search_input()
         elif command == 'a':  # Add an item
             secrets.add_input()
@@ -135,9 +158,23 @@ def lock():
         Lock the vault and ask the user to login again
     """
 
-    # Lock the vault
+    # Wipe derived keys and the data key from memory, then lock the vault
+    if global_scope['enc'] is not None:
+        global_scope['enc'].data_key = None
+        global_scope['enc'].clear_cache()
     global_scope['enc'] = None
 
+    # Forget decrypted secrets
+    SecretModel.forget_all_decrypted()
+
+    # Drop the catalog of secrets and categories
+    global_scope['catalog'] = None
+    global_scope['categories'] = None
+    global_scope['category_ids'] = None
+
+    # Close the connections opened with the master key
+    drop_sessions()
+
     # Clear screen
     clear_screen()
 
@@ -174,7 +211,7 @@ def check_autolock_timer():
 
     global timer
 
-    if timer and int(time.time()) > timer + int(global_scope['conf'].autoLockTTL):
+    if timer and int(time.time()) > timer + global_scope['conf'].autoLockTTL:
         print()
         print("The vault has been locked due to inactivity.")
         lock()
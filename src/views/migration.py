@@ -13,7 +13,7 @@ from ..modules.carry import global_scope
 from ..lib.Config import Config
 from ..lib.Encryption import Encryption
 from .setup import create_db
-from .users import validation_key_new
+from .users import validation_key_new, data_key_new
 from .import_export import import_from_json
 from . import menu
 
@@ -73,6 +73,9 @@ def migrate(vault_path, config_path, new_vault_path=None):
     # Create validation key
     validation_key_new()
 
+    # Create the data key used to encrypt secrets
+    data_key_new()
+
     # Import items in the new db
     result = import_from_json(rows=import_)
     if result is False:
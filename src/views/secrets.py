@@ -1,27 +1,112 @@
 # Secrets view
 
+import sys
 import time
 import random
+import shutil
 
-from sqlalchemy import or_, func
+from sqlalchemy import and_, or_, func, select, text
+from sqlalchemy.orm import joinedload
 from tabulate import tabulate
 from passwordgenerator import pwgenerator
 
 from ..models.base import get_session
-from ..models.Secret import SecretModel
+from ..models.Secret import SecretModel, has_search_index
+from ..models.Category import CategoryModel
+from ..lib.Catalog import Catalog, CatalogRow
+from ..lib.SearchQuery import SearchQuery
 from ..modules.misc import confirm, clear_screen
 from ..modules.carry import global_scope
 from ..modules import autocomplete
-from .categories import get_name as get_category_name, pick, all as all_categories
+from .categories import get_names as get_category_names, pick, all as all_categories
 from . import clipboard, menu
 
 
-def all():
+# Titles and widths of the columns of the paged listing (see `page_all()`)
+page_columns = [('Item', 6), ('Category', 16), ('Name', 28), ('URL', 32), ('Login', 28)]
+
+
+def all(encrypted=False):
+    """
+        Return a list of all secrets.
+        Encrypted fields are loaded when they are read, or with the secrets if `encrypted` is set.
+    """
+
+    query = get_session().query(SecretModel)
+    if encrypted:
+        query = query.options(joinedload(SecretModel.payload))
+
+    return query.order_by(SecretModel.id).all()
+
+
+def list_all():
+    """
+        Return the ID, name, URL, login and category of all secrets,
+        from the catalog when the vault is unlocked
+    """
+
+    if global_scope['catalog'] is not None:
+        return global_scope['catalog'].all()
+
+    return select_rows()
+
+
+def select_listed(*conditions):
+    """
+        Return the select of the listed columns (ID, name, URL, login and category ID)
+        of the secrets matching all `conditions`, sorted by ID
+    """
+
+    statement = select([SecretModel.id, SecretModel.name, SecretModel.url,
+                        SecretModel.login, SecretModel.category_id])
+
+    for condition in conditions:
+        statement = statement.where(condition)
+
+    return statement.order_by(SecretModel.id)
+
+
+def select_rows(*conditions, limit=None):
     """
-        Return a list of all secrets
+        Return the secrets matching all `conditions` (up to `limit`) as read-only `CatalogRow` records.
+        Rows are read without the ORM: no model instances nor identity map.
     """
 
-    return get_session().query(SecretModel).order_by(SecretModel.id).all()
+    statement = select_listed(*conditions)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    return [CatalogRow(*row) for row in get_session().execute(statement)]
+
+
+def load_catalog():
+    """
+        Return a catalog of the secrets loaded from the database
+    """
+
+    return Catalog(get_session().execute(select_listed()))
+
+
+def build_catalog():
+    """
+        Load the in-memory catalog of secrets
+    """
+
+    global_scope['catalog'] = load_catalog()
+
+    return global_scope['catalog']
+
+
+def update_catalog(secret):
+    """
+        Add or update a secret in the catalog
+    """
+
+    if global_scope['catalog'] is not None:
+        global_scope['catalog'].update(
+            secret.id, secret.name, secret.url, secret.login, secret.category_id)
+
+    return True
 
 
 def to_table(rows=[]):
@@ -29,9 +114,16 @@ def to_table(rows=[]):
         Transform rows in a table
     """
 
+    # Secrets come with their category, listed rows (`CatalogRow`) only have its ID
+    names = {}
+    if any(not isinstance(secret, SecretModel) for secret in rows):
+        names = get_category_names()
+
     # Retrieve id and name
-    all_secrets = [[secret.id, get_category_name(secret.category_id), secret.name,
-                    secret.url, secret.login] for secret in rows]
+    all_secrets = [[secret.id,
+                    secret.category_name if isinstance(secret, SecretModel)
+                    else names.get(secret.category_id, ''),
+                    secret.name, secret.url, secret.login] for secret in rows]
 
     if len(all_secrets) > 0:
         return tabulate(all_secrets, headers=['Item', 'Category', 'Name', 'URL', 'Login'])
@@ -39,11 +131,111 @@ def to_table(rows=[]):
         return 'Empty!'
 
 
+def iter_pages(page_size=50):
+    """
+        Yield the listed rows of all secrets (`CatalogRow`), sorted by ID, in pages of `page_size` rows.
+        Each page is read when the next one is requested: from the catalog when the vault is
+        unlocked, otherwise from the database, starting after the last ID of the previous page.
+    """
+
+    catalog = global_scope['catalog']
+    if catalog is not None:
+        for start in range(0, len(catalog), page_size):
+            yield catalog.get_rows(start, start + page_size)
+
+        return
+
+    last_id = 0
+    while True:
+        rows = select_rows(SecretModel.id > last_id, limit=page_size)
+
+        if rows:
+            yield rows
+
+        if len(rows) < page_size:
+            return
+
+        last_id = rows[-1].id
+
+
+def get_page_size():
+    """
+        Return the number of rows of a page, to fill the terminal
+    """
+
+    # Keep room for the table header and the pager prompt
+    return max(10, shutil.get_terminal_size().lines - 4)
+
+
+def format_page_row(values):
+    """
+        Format a row of the paged listing, in fixed-width columns (see `page_columns`).
+        Longer values are truncated.
+    """
+
+    cells = []
+    for value, (title, width) in zip(values, page_columns):
+        value = ' '.join(str(value).split())  # On a single line
+        if len(value) > width:
+            value = value[:width - 3] + '...'
+        cells.append(value.ljust(width))
+
+    return '  '.join(cells).rstrip()
+
+
+def to_page(rows, category_names):
+    """
+        Transform a page of rows in lines of fixed-width columns
+    """
+
+    return '\n'.join(format_page_row([row.id, category_names.get(row.category_id, ''),
+                                      row.name, row.url, row.login]) for row in rows)
+
+
+def page_all(page_size=None):
+    """
+        Display all secrets, one page at a time. The next page is read when the user asks for it.
+    """
+
+    total = count()
+
+    if total == 0:
+        print('Empty!')
+        return True
+
+    # Category names are loaded once for all pages
+    category_names = get_category_names()
+
+    print(format_page_row([title for title, width in page_columns]))
+    print(format_page_row(['-' * width for title, width in page_columns]))
+
+    shown = 0
+    for rows in iter_pages(page_size or get_page_size()):
+        print(to_page(rows, category_names))
+        shown += len(rows)
+
+        if shown >= total:
+            break
+
+        print()
+        input_ = menu.get_input(
+            message='%d of %d items. Press Enter for more items or type any key to stop: ' % (shown, total))
+
+        if input_ != '':  # Any key, or Ctrl-C
+            break
+
+    return True
+
+
 def count():
     """
         Return a count of all secrets
     """
 
+    # The catalog keeps count when the vault is unlocked
+    if global_scope['catalog'] is not None:
+        return len(global_scope['catalog'])
+
     return get_session().query(SecretModel).count()
 
 
@@ -58,15 +250,16 @@ def get_by_id(id_):
 def get_names(limit=2000):
     """ Return secret's names for auto-completion """
 
-    results = get_session().query(SecretModel.name).\
-        filter(SecretModel.name != '').\
-        limit(limit).\
-        all()
+    if global_scope['catalog'] is not None:
+        return global_scope['catalog'].get_names(limit)
 
-    if results:
-        return [result.name for result in results]
+    results = get_session().execute(
+        select([SecretModel.name]).
+        where(SecretModel.name != '').
+        order_by(SecretModel.id).
+        limit(limit))
 
-    return []
+    return [result.name for result in results]
 
 
 def get_top_logins(limit=10):
@@ -74,17 +267,14 @@ def get_top_logins(limit=10):
 
     count_ = func.count('*')
 
-    results = get_session().query(SecretModel.login, count_).\
-        filter(SecretModel.login != '').\
-        group_by(SecretModel.login).\
-        order_by(count_.desc()).\
-        limit(limit).\
-        all()
-
-    if results:
-        return [result.login for result in results]
+    results = get_session().execute(
+        select([SecretModel.login]).
+        where(SecretModel.login != '').
+        group_by(SecretModel.login).
+        order_by(count_.desc()).
+        limit(limit))
 
-    return []
+    return [result.login for result in results]
 
 
 def add(name, url='', login='', password='', notes='', category_id=None):
@@ -101,6 +291,33 @@ def add(name, url='', login='', password='', notes='', category_id=None):
     get_session().add(secret)
     get_session().commit()
 
+    update_catalog(secret)
+
+    return True
+
+
+def add_many(rows):
+    """
+        Create many secrets at once, passwords and notes are encrypted in one batch
+        `rows` is a list of dicts with the same keys as the arguments of `add()`
+    """
+
+    items = [SecretModel(name=row.get('name'),
+                         url=row.get('url'),
+                         login=row.get('login'),
+                         password=None,
+                         notes=None,
+                         category_id=row.get('category_id'))
+             for row in rows]
+    SecretModel.encrypt_many(items, [(row.get('password') or '', row.get('notes') or '')
+                                     for row in rows])
+
+    get_session().add_all(items)
+    get_session().commit()
+
+    for item in items:
+        update_catalog(item)
+
     return True
 
 
@@ -194,6 +411,9 @@ def delete(id_):
         get_session().delete(secret)
         get_session().commit()
 
+        if global_scope['catalog'] is not None:
+            global_scope['catalog'].delete(int(id_))
+
         return True
 
     return False
@@ -221,21 +441,163 @@ def delete_confirm(id_):
 def search(query):
     """
         Search by keyword
+        Names, URLs and logins containing the keyword are found with the full-text search index,
+        which requires at least 3 characters (one trigram). Vaults without the index use LIKE.
+    """
+
+    query = str(query)
+
+    # Search in memory when the vault is unlocked
+    if global_scope['catalog'] is not None:
+        return global_scope['catalog'].search(query)
+
+    if len(query) < 3 or not has_search_index():
+        like = '%' + escape_like(query) + '%'
+
+        return select_rows(or_(*[column.like(like, escape='\\')
+                                 for column in [SecretModel.name, SecretModel.url, SecretModel.login]]))
+
+    return select_rows(SecretModel.id.in_(search_ids(query)))
+
+
+def search_ids(query, columns=['name', 'url', 'login']):
+    """
+        Return a select of the secret IDs matching a keyword in the full-text search index
+    """
+
+    # Search the keyword as a phrase in the columns, quotes are escaped by doubling them
+    match = '{%s}: "%s"' % (' '.join(columns), query.replace('"', '""'))
+
+    return text('SELECT rowid FROM secrets_fts WHERE secrets_fts MATCH :match') \
+        .bindparams(match=match).columns(SecretModel.id)
+
+
+def search_query(query):
+    """
+        Search with a query of field-qualified terms, such as `login:alice cat:infra name:^db`
+        (see `SearchQuery` for the syntax). Terms must all match.
+    """
+
+    conditions = []
+
+    for field, operator, value in SearchQuery(query).terms:
+        condition = get_search_condition(field, operator, value)
+
+        # Categories are matched first, then their secrets are found with the category index
+        if field == 'category':
+            condition = SecretModel.category_id.in_(
+                select([CategoryModel.id]).where(condition))
+
+        conditions.append(condition)
+
+    return select_rows(*conditions)
+
+
+def get_search_condition(field, operator, value):
+    """
+        Return the SQL condition of a search term, written to use the indexes:
+        the full-text search index for substrings, and the case-insensitive indexes
+        for prefixes and exact values
     """
 
-    query = '%' + str(query) + '%'
+    if field == 'category':
+        columns = [CategoryModel.name]
+    elif field:
+        columns = [getattr(SecretModel, field)]
+    else:
+        columns = [SecretModel.name, SecretModel.url, SecretModel.login]
+
+    # Secrets fields in the full-text search index, when the vault has it
+    indexed = []
+    if has_search_index():
+        indexed = [column.name for column in columns if column.table is SecretModel.__table__]
+
+    if operator == 'equals':
+        return or_(*[column.collate('NOCASE') == value for column in columns])
+    elif operator == 'prefix':
+        return or_(*[get_prefix_condition(column, value) for column in columns])
+    elif operator == 'pattern':
+        like = escape_like(value).replace('*', '%')
 
-    return get_session().query(SecretModel) \
-        .filter(or_(SecretModel.name.like(query), SecretModel.url.like(query), SecretModel.login.like(query))) \
-        .order_by(SecretModel.id).all()
+        # Patterns starting with a wildcard cannot use the column indexes, but the
+        # full-text search index can (with at least 3 characters in a row, without escapes)
+        if indexed and like.startswith('%') and like == value.replace('*', '%'):
+            return SecretModel.id.in_(search_like_ids(like, indexed))
 
+        return or_(*[column.like(like, escape='\\') for column in columns])
 
-def search_dispatch(query):
+    # Substrings, the full-text search index requires at least 3 characters (one trigram)
+    if indexed and len(value) >= 3:
+        return SecretModel.id.in_(search_ids(value, indexed))
+
+    return or_(*[column.like('%' + escape_like(value) + '%', escape='\\') for column in columns])
+
+
+def get_prefix_condition(column, prefix):
+    """
+        Return a case-insensitive range condition matching the values starting with `prefix`
+    """
+
+    # `NOCASE` only folds ASCII letters, they are lowercased to compute the upper bound
+    prefix = ''.join(char.lower() if char.isascii() else char for char in prefix)
+    column = column.collate('NOCASE')
+
+    if ord(prefix[-1]) >= sys.maxunicode:
+        return column >= prefix
+
+    # Uppercase letters are sorted as lowercase ones, the character following `@` is `[`
+    last = chr(ord(prefix[-1]) + 1)
+    if 'A' <= last <= 'Z':
+        last = '['
+
+    return and_(column >= prefix, column < prefix[:-1] + last)
+
+
+def search_like_ids(like, columns):
+    """
+        Return a select of the secret IDs matching a LIKE pattern in the full-text search index
+    """
+
+    conditions = ' OR '.join('%s LIKE :like' % (column) for column in columns)
+
+    return text('SELECT rowid FROM secrets_fts WHERE ' + conditions) \
+        .bindparams(like=like).columns(SecretModel.id)
+
+
+def escape_like(value):
+    """
+        Escape the LIKE wildcards of a value, with `\\`
+    """
+
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_fuzzy(query, limit=10):
+    """
+        Typo-tolerant search by keyword, returns up to `limit` results, best matches first
+    """
+
+    # Without the in-memory catalog, load the searched columns for this search only
+    catalog = global_scope['catalog']
+    if catalog is None:
+        catalog = load_catalog()
+
+    return catalog.search_fuzzy(query, limit)
+
+
+def search_dispatch(query, fuzzy=False):
     """
         Run a user search. If the query is an integer we will first search by id, otherwise,
-        it will be a keyword based search
+        it will be a keyword based search (ranked and typo-tolerant if `fuzzy` is set)
     """
 
+    if fuzzy:
+        return search_fuzzy(query)
+
+    # Queries with field-qualified terms or operators are run on the database
+    if type(query) is not int and SearchQuery(query).is_qualified():
+        return search_query(query)
+
     if type(query) is int or query.isdigit():
         # Search an ID matching the input
         row = get_by_id(int(query))
@@ -269,11 +631,26 @@ def search_input():
     elif query == 'b':  # Return to previous menu
         return False
 
+    # Queries starting with `~` run a fuzzy search
+    fuzzy = query.startswith('~')
+    if fuzzy:
+        query = query[1:]
+
     # Get results
-    results = search_dispatch(query)
+    results = search_dispatch(query, fuzzy=fuzzy)
+
+    # Look for close matches when nothing contains the query
+    if not results and not fuzzy and not SearchQuery(query).is_qualified():
+        results = search_dispatch(query, fuzzy=True)
+        fuzzy = True
+
+        if results:
+            print('No exact match, closest results:')
 
-    if len(results) == 1:  # Exactly one result
-        return item_view(results[0])
+    if fuzzy and results:  # Ranked results are always listed
+        return search_results(results)
+    elif len(results) == 1:  # Exactly one result
+        return item_view(get_by_id(results[0].id))
     elif len(results) > 1:  # More than one result
         return search_results(results)
     else:
@@ -307,7 +684,7 @@ def search_results(rows):
             result = [row for row in rows if row.id == int(input_)]
 
             if result:
-                return item_view(result[0])
+                return item_view(get_by_id(result[0].id))
         except ValueError:  # Non integer
             pass
 
@@ -422,7 +799,7 @@ def edit_input(element_name, item):
 
     if element_name == 'category':
         print('* Current nategory: %s' %
-              (get_category_name(item.category_id) or 'Empty!'))
+              (item.category_name or 'Empty!'))
         category_id = pick(message='* New category: ', optional=True)
 
         if category_id is not False:
@@ -488,6 +865,8 @@ def edit_input(element_name, item):
     get_session().add(item)
     get_session().commit()
 
+    update_catalog(item)
+
     print('The %s has been updated.' % (element_name))
     time.sleep(2)
 
@@ -504,7 +883,7 @@ def show_secret(item):
               (global_scope['conf'].hideSecretTTL))
         print('* The password is: %s' % (item.password), end="\r")
 
-        time.sleep(int(global_scope['conf'].hideSecretTTL))
+        time.sleep(global_scope['conf'].hideSecretTTL)
     except KeyboardInterrupt:
         # Will catch `^-c` and immediately hide the password
         pass
@@ -2,16 +2,18 @@ import getpass
 import sys
 import uuid
 
-from ..models.base import Base, get_session, get_engine
+from ..models.base import Base, get_session
 from ..models.Category import CategoryModel  # Imported for schema creation
 from ..models.Secret import SecretModel  # Imported for schema creation
 from ..modules.carry import global_scope
-from .users import validation_key_new
+from .users import validation_key_new, data_key_new
 from .menu import get_input
+from . import upgrade
 from ..lib.Encryption import Encryption
+from ..lib.KeyDerivation import KeyDerivation
 
 
-def initialize(salt):
+def initialize(salt, unlock_time=250):
     """
         Vault setup
     """
@@ -29,12 +31,21 @@ def initialize(salt):
             # Create Encryption instance and set it to the global scope
             global_scope['enc'] = Encryption(key.encode())
 
+            # Pick key derivation parameters matching the target unlock time
+            calibrate_kdf(unlock_time)
+
+            # The derived key is given to SQLCipher as a raw key, skipping its own key derivation
+            global_scope['conf'].update('rawKey', True, quiet=True)
+
             # Create db
             create_db()
 
             # Create validation key
             validation_key_new()
 
+            # Create the data key used to encrypt secrets
+            data_key_new()
+
             print()
             print("Your vault has been created and encrypted with your master key.")
             print("Your unique salt is: %s " % (salt))
@@ -50,12 +61,27 @@ def create_db():
     """
 
     session = get_session()
-    Base.metadata.create_all(get_engine())
+    Base.metadata.create_all(session.get_bind())
     session.commit()
 
+    # New vaults are created with the latest schema
+    upgrade.set_schema_version()
+
     return True
 
 
+def calibrate_kdf(unlock_time=250):
+    """
+        Benchmark the machine and save the key derivation parameters
+        needed to unlock the vault in `unlock_time` milliseconds
+    """
+
+    iterations = KeyDerivation().calibrate(unlock_time)
+    global_scope['conf'].update('kdfIterations', iterations, quiet=True)
+
+    return iterations
+
+
 def get_key_input():
     """
         Prompt user for a master key
@@ -0,0 +1,369 @@
+# Upgrades of existing vaults, run after the vault is unlocked
+#
+# The schema version of a vault is saved in the users table. Upgrade steps are run in order,
+# each one in its own transaction with the new schema version.
+# To change the schema, add a step at the end of `get_steps()`.
+
+import shutil
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import joinedload
+
+from ..models.base import get_session
+from ..models.Category import CategoryModel
+from ..models.Secret import SecretModel, search_ddl, search_indexes, supports_search_index, has_search_index
+from ..models.SecretPayload import SecretPayloadModel, payload_ddl
+from ..models.User import UserModel
+from ..lib.Encryption import Encryption
+from ..modules.carry import global_scope
+
+
+class UpgradeError(Exception):
+    """
+        Raised when an upgrade step fails, the vault is left at the previous schema version
+    """
+
+    def __init__(self, version, description, backup_path=None):
+        super().__init__('Upgrade %d failed: %s' % (version, description))
+        self.version = version
+        self.description = description
+        self.backup_path = backup_path  # `None` if no backup was needed
+
+
+def get_steps():
+    """
+        Return the ordered list of upgrade steps as tuples:
+        (schema version reached, description, function, `True` if the step rewrites the vault)
+    """
+
+    return [
+        (1, 'Store encrypted fields as raw bytes', convert_raw_fields, True),
+        (2, 'Encrypt secrets with a data key', create_data_key, True),
+        (3, 'Add indexes', create_indexes, False),
+        (4, 'Add the full-text search index', create_search_index, False),
+        (5, 'Add the case-insensitive categories index', create_indexes, False),
+        (6, 'Store encrypted fields in their own table', move_payloads, True),
+    ]
+
+
+def get_latest_version():
+    """
+        Return the schema version of a vault with all upgrades applied
+    """
+
+    return get_steps()[-1][0]
+
+
+def run():
+    """
+        Run pending upgrades
+    """
+
+    version = get_schema_version()
+    pending = [step for step in get_steps() if step[0] > version]
+
+    if not pending:
+        return True
+
+    # Back up the vault before the first step rewriting it
+    backup_path = None
+    if any(rewrites for version_, description, function, rewrites in pending):
+        backup_path = backup()
+        print()
+        print('Your vault will be upgraded. A backup has been saved to `%s`.' % (backup_path))
+
+    for version_, description, function, rewrites in pending:
+        print('* Upgrade %d of %d: %s' % (version_, get_latest_version(), description))
+
+        try:
+            run_step(version_, function)
+        except Exception as error:
+            raise UpgradeError(version_, description, backup_path) from error
+
+    # Reclaim the space freed by the upgrades
+    if any(rewrites for version_, description, function, rewrites in pending):
+        vacuum()
+
+    return True
+
+
+def run_step(version, function):
+    """
+        Run an upgrade step and save the schema version it reaches, in one transaction.
+        The driver only opens transactions before data changes: the transaction is opened
+        explicitly so that schema changes (tables, indexes, triggers) are rolled back as well.
+    """
+
+    connection = get_session().connection()
+    dbapi_connection = connection.connection.connection
+    isolation_level = dbapi_connection.isolation_level
+
+    # Without an isolation level, the driver leaves transactions to the statements
+    dbapi_connection.isolation_level = None
+    try:
+        connection.execute('BEGIN')
+        function()
+        set_setting('schema_version', str(version), commit=False)
+        get_session().commit()
+    except Exception:
+        # Leave the vault at the last complete version
+        get_session().rollback()
+        raise
+    finally:
+        dbapi_connection.isolation_level = isolation_level
+
+    return True
+
+
+def get_schema_version():
+    """
+        Return the schema version of the vault
+    """
+
+    version = get_setting('schema_version')
+    if version is not None:
+        return int(version)
+
+    return 0
+
+
+def set_schema_version(version=None):
+    """
+        Save the schema version of the vault (by default: the latest version, for new vaults)
+    """
+
+    if version is None:
+        version = get_latest_version()
+
+    return set_setting('schema_version', str(version))
+
+
+def backup():
+    """
+        Copy the vault file next to it and return the backup path
+    """
+
+    # Make sure everything is written to the file first
+    get_session().commit()
+
+    path = global_scope['db_file'] + '.backup'
+    shutil.copy2(global_scope['db_file'], path)
+
+    return path
+
+
+def get_setting(key):
+    """
+        Return a vault setting stored in the users table
+    """
+
+    user = get_session().query(UserModel).filter(
+        UserModel.key == key).order_by(UserModel.id.desc()).first()
+
+    if user:
+        return user.value
+
+    return None
+
+
+def set_setting(key, value, commit=True):
+    """
+        Create or update a vault setting stored in the users table
+    """
+
+    user = get_session().query(UserModel).filter(
+        UserModel.key == key).order_by(UserModel.id.desc()).first()
+
+    if not user:
+        user = UserModel(key=key)
+
+    user.value = value
+    get_session().add(user)
+    if commit:
+        get_session().commit()
+
+    return True
+
+
+def convert_raw_fields():
+    """
+        Convert encrypted passwords and notes from base 64 to raw bytes.
+        Fields are not decrypted, only decoded, so this does not require the salt of each secret.
+    """
+
+    enc = global_scope['enc']
+
+    move_payloads()
+
+    rows = get_session().query(
+        SecretPayloadModel.id, SecretPayloadModel._password, SecretPayloadModel._notes).all()
+
+    updates = []
+    for id_, password, notes in rows:
+        item = {'id': id_}
+        if password is not None:
+            item['_password'] = enc.to_raw(password)
+        if notes is not None:
+            item['_notes'] = enc.to_raw(notes)
+
+        if item.get('_password') != password or item.get('_notes') != notes:
+            updates.append(item)
+
+    if updates:
+        print('  Converting %d items to the new storage format...' % (len(updates)))
+
+        get_session().bulk_update_mappings(SecretPayloadModel, updates)
+
+    return len(updates)
+
+
+def create_data_key():
+    """
+        Create a data key for vaults created without one and re-encrypt all secrets with it.
+        Changing the master key then only requires to re-encrypt the data key.
+    """
+
+    enc = global_scope['enc']
+
+    move_payloads()
+
+    # Decrypt all secrets with the master key
+    rows = get_session().query(SecretModel).options(joinedload(SecretModel.payload)).all()
+    values = SecretModel.decrypt_many(rows, enc)
+
+    if rows:
+        print('  Encrypting %d items with a new data key...' % (len(rows)))
+
+    # Create the data key and encrypt all secrets with it. The vault key only gets the data key
+    # once it is saved (see `users.data_key_load()`), secrets are encrypted with a copy.
+    data_key = enc.gen_data_key()
+    get_session().add(UserModel(key='data_key', value=enc.wrap(data_key)))
+    data_enc = Encryption(enc.key, version=enc.version)
+    data_enc.data_key = data_key
+    SecretModel.encrypt_many(rows, values, data_enc)
+
+    get_session().add_all(rows)
+
+    return len(rows)
+
+
+def move_payloads():
+    """
+        Move the encrypted fields of secrets from the `secrets` table to `secret_payloads`.
+        Earlier steps run on the encrypted fields, they call this first.
+    """
+
+    connection = get_session().connection()
+    columns = [column['name'] for column in inspect(connection).get_columns('secrets')]
+
+    if '_password' not in columns:  # Already moved
+        return 0
+
+    SecretPayloadModel.__table__.create(bind=connection, checkfirst=True)
+    for statement in payload_ddl:
+        get_session().execute(statement)
+
+    moved = get_session().execute(
+        'INSERT INTO secret_payloads (id, _password, _notes, _salt) SELECT id, _password, _notes, _salt FROM secrets').rowcount
+
+    if supports_drop_column():
+        for column in ['_password', '_notes', '_salt']:
+            get_session().execute('ALTER TABLE secrets DROP COLUMN %s' % (column))
+    else:
+        rebuild_secrets_table()
+
+    return moved
+
+
+def supports_drop_column():
+    """
+        Return whether the SQLite library supports `ALTER TABLE ... DROP COLUMN` (SQLite 3.35+)
+    """
+
+    version = get_session().execute('SELECT sqlite_version()').scalar()
+
+    return tuple(int(part) for part in version.split('.')[:2]) >= (3, 35)
+
+
+def rebuild_secrets_table():
+    """
+        Rebuild the `secrets` table with the columns of the model, for SQLite libraries
+        that cannot drop columns: the rows are copied to a new table that replaces the old one,
+        then the indexes and triggers dropped with the old table are created again
+    """
+
+    connection = get_session().connection()
+    table = SecretModel.__table__
+    columns = ', '.join(column.name for column in table.columns)
+
+    create = str(CreateTable(table).compile(dialect=connection.dialect))
+    get_session().execute(create.replace('CREATE TABLE secrets ', 'CREATE TABLE secrets_new ', 1))
+    get_session().execute('INSERT INTO secrets_new (%s) SELECT %s FROM secrets' % (columns, columns))
+    get_session().execute('DROP TABLE secrets')
+    get_session().execute('ALTER TABLE secrets_new RENAME TO secrets')
+
+    for index in table.indexes:
+        index.create(bind=connection)
+
+    # Row IDs are kept, the full-text search index is still up to date
+    if has_search_index():
+        for statement in search_ddl:
+            get_session().execute(statement)
+
+    for statement in payload_ddl:
+        get_session().execute(statement)
+
+    return True
+
+
+def create_indexes():
+    """
+        Create the indexes declared on the models that are missing from the vault
+    """
+
+    connection = get_session().connection()
+    inspector = inspect(connection)
+
+    created = 0
+    for model in [SecretModel, CategoryModel]:
+        existing = [index['name']
+                    for index in inspector.get_indexes(model.__tablename__)]
+
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                index.create(bind=connection)
+                created += 1
+
+    return created
+
+
+def create_search_index():
+    """
+        Create the full-text search index and its triggers, then index all secrets.
+        Skipped when the SQLite library does not support it, secrets are then searched with LIKE.
+    """
+
+    search_indexes.pop(global_scope['db_file'], None)
+
+    if not supports_search_index(get_session().connection()):
+        return 0
+
+    for statement in search_ddl:
+        get_session().execute(statement)
+
+    get_session().execute(
+        "INSERT INTO secrets_fts(secrets_fts) VALUES ('rebuild')")
+
+    return get_session().query(SecretModel).count()
+
+
+def vacuum():
+    """
+        Rebuild the database file to reclaim unused space
+    """
+
+    get_session().execute('VACUUM')
+    get_session().commit()
+
+    return True
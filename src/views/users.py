@@ -72,3 +72,62 @@ def validation_key_rekey(newenc):
         return True
 
     return False
+
+
+def data_key_new():
+    """
+        Create the vault data key, encrypted with the master key
+    """
+
+    data_key = global_scope['enc'].gen_data_key()
+
+    # Save user
+    user = UserModel(key='data_key',
+                     value=global_scope['enc'].wrap(data_key))
+    get_session().add(user)
+    get_session().commit()
+
+    global_scope['enc'].data_key = data_key
+
+    return True
+
+
+def data_key_load():
+    """
+        Decrypt the vault data key with the master key and use it to encrypt secrets
+        Returns `False` for vaults without a data key
+    """
+
+    user = get_session().query(UserModel).filter(
+        UserModel.key == 'data_key').order_by(UserModel.id.desc()).first()
+
+    if user:
+        global_scope['enc'].data_key = global_scope['enc'].unwrap(user.value)
+
+        return True
+
+    return False
+
+
+def data_key_rekey(newenc):
+    """
+        Replace the data key encryption with a new master key
+    """
+
+    # Get data key
+    user = get_session().query(UserModel).filter(
+        UserModel.key == 'data_key').order_by(UserModel.id.desc()).first()
+
+    if user and global_scope['enc'].data_key:
+        data_key = bytes(global_scope['enc'].data_key)
+
+        # Update data key
+        user.value = newenc.wrap(data_key)
+        newenc.data_key = data_key
+
+        get_session().add(user)
+        get_session().commit()
+
+        return True
+
+    return False